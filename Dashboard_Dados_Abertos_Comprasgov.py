@@ -1,31 +1,69 @@
 import requests
+import numpy as np
 import pandas as pd
 import locale
-from dateutil import parser
 from dash import Dash, html, dcc, dash_table
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 from datetime import datetime, timedelta
 import plotly.express as px
-import io
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import pickle
+import random
+import re
+import smtplib
 import socket
+import sqlite3
+import time
 import threading
-import tkinter as tk
-from tkinter import ttk
+import sys
 import webbrowser
+from functools import lru_cache
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.message import EmailMessage
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from flask import abort, send_file
+from requests.adapters import HTTPAdapter
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+    import openpyxl
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+try:
+    import tkinter as tk
+    from tkinter import ttk
+except ImportError:
+    # Sem Tk (servidores sem interface gráfica) o painel roda só no modo servidor
+    tk = ttk = None
 
 def get_local_ip():
     hostname = socket.gethostname()
     local_ip = socket.gethostbyname(hostname)
     return local_ip
 
-def iniciar_dashboard():
-    app.run(host="0.0.0.0", port=8050, debug=False)
+def iniciar_dashboard(host="0.0.0.0", porta=8050):
+    app.run(host=host, port=porta, debug=False)
 
-def abrir_janela():
+def abrir_janela(codigo, porta=8050):
     root = tk.Tk()
     root.title("Dashboard - Inicializando")
-    root.geometry("400x150")
+    root.geometry("450x180")
 
     label = tk.Label(root, text="Carregando dashboard...", font=("Arial", 12))
     label.pack(pady=10)
@@ -35,7 +73,7 @@ def abrir_janela():
     progress.start(10)
 
     ip = get_local_ip()
-    url = f"http://{ip}:8050"
+    url = f"http://{ip}:{porta}"
 
     def abrir_navegador():
         webbrowser.open(url)
@@ -45,42 +83,914 @@ def abrir_janela():
     link_label.bind("<Button-1>", lambda e: abrir_navegador())
 
     # Iniciar o servidor em outra thread
-    threading.Thread(target=iniciar_dashboard, daemon=True).start()
+    threading.Thread(target=iniciar_dashboard, args=("0.0.0.0", porta), daemon=True).start()
 
-    # Fechar a janela de loading após alguns segundos
+    # Fechar a janela de loading quando a primeira carga dos dados terminar
     def fechar_loading():
+        if codigo and atualizador.obter(codigo) is None:
+            label.config(text=f"Carregando dados...\n{atualizador.descrever_progresso(codigo)}")
+            root.after(500, fechar_loading)
+            return
         progress.stop()
         root.title("Dashboard em execução")
         label.config(text="Dashboard iniciado com sucesso!")
 
-    root.after(5000, fechar_loading)  # 5s de espera
+    root.after(500, fechar_loading)
     root.mainloop()
 
+# Faixas de vigência restante das atas, em dias; acima da última é 🟢
+FAIXAS_VIGENCIA = {"🔴": 90, "🟡": 180}
+DESCRICAO_FAIXAS = {"🔴": "até 90 dias", "🟡": "até 180 dias", "🟢": "mais de 180 dias"}
+
 def definir_status(dias):
-    if dias <= 90:
-        return "🔴"
-    elif dias <= 180:
-        return "🟡"
-    else:
-        return "🟢"
+    # Vetorizado: recebe a série de dias restantes e devolve o status de cada ata
+    dias = pd.Series(dias)
+    return pd.Series(
+        np.select(
+            [(dias <= limite).fillna(False).to_numpy(dtype=bool) for limite in FAIXAS_VIGENCIA.values()],
+            list(FAIXAS_VIGENCIA), default="🟢",
+        ),
+        index=dias.index,
+    )
+
+# =========================
+# CLIENTE HTTP DAS APIs
+# =========================
+API_BASE_URL = os.environ.get("COMPRASGOV_API_URL", "https://dadosabertos.compras.gov.br")
+TIMEOUT_CONEXAO = float(os.environ.get("COMPRASGOV_TIMEOUT_CONEXAO", 10))
+TIMEOUT_LEITURA = float(os.environ.get("COMPRASGOV_TIMEOUT_LEITURA", 60))
+MAX_TENTATIVAS = 5
+BACKOFF_BASE = 1.0     # segundos
+BACKOFF_MAXIMO = 30.0  # segundos
+REQUISICOES_POR_SEGUNDO = float(os.environ.get("COMPRASGOV_REQUISICOES_POR_SEGUNDO", 5))
+TAMANHO_POOL_CONEXOES = 16
+STATUS_REPETIR = {429, 500, 502, 503, 504}
+
+# =========================
+# CACHE LOCAL DAS RESPOSTAS
+# =========================
+CACHE_DIR = os.environ.get(
+    "COMPRASGOV_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "dashboard_comprasgov")
+)
+CACHE_TAMANHO_MAXIMO = int(os.environ.get("COMPRASGOV_CACHE_TAMANHO_MAXIMO", 512 * 1024 * 1024))  # bytes
+HORA = 60 * 60
+# Validade (em segundos) de cada endpoint, identificado pelo último trecho da URL
+CACHE_TTL = {
+    "1_consultarUasg": 7 * 24 * HORA,
+    "1_consultarContratacoes_PNCP_14133": 6 * HORA,
+    "2_consultarItensContratacoes_PNCP_14133": 6 * HORA,
+    "1_consultarARP": 6 * HORA,
+}
+CACHE_TTL_PADRAO = 1 * HORA
+
+def nome_endpoint(url):
+    return url.rstrip("/").rsplit("/", 1)[-1]
+
+class BancoLocal:
+    # Conexão SQLite (WAL) aberta no primeiro uso de cada processo. Os workers do
+    # gunicorn nascem por fork do mestre e não podem herdar a conexão nem o lock
+    # dele, então o fork zera os dois e o filho abre a sua própria conexão
+    def __init__(self, caminho, timeout=5):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.caminho = caminho
+        self.timeout = timeout
+        self.reiniciar()
+        os.register_at_fork(after_in_child=self.reiniciar)
+
+    def reiniciar(self):
+        self.lock = threading.Lock()
+        self.aberta = None
+
+    @property
+    def conexao(self):
+        if self.aberta is None:
+            conexao = sqlite3.connect(self.caminho, check_same_thread=False, timeout=self.timeout)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            self.criar_tabelas(conexao)
+            conexao.commit()
+            self.aberta = conexao
+        return self.aberta
+
+    def criar_tabelas(self, conexao):
+        pass
+
+class CacheRespostas(BancoLocal):
+    # Respostas JSON comprimidas em um SQLite local, com validade por endpoint,
+    # revalidação por ETag/Last-Modified e descarte LRU ao passar do tamanho máximo
+    def __init__(self, caminho, tamanho_maximo=CACHE_TAMANHO_MAXIMO, ttls=CACHE_TTL):
+        super().__init__(caminho)
+        self.tamanho_maximo = tamanho_maximo
+        self.ttls = ttls
+
+    def criar_tabelas(self, conexao):
+        conexao.execute(
+            """CREATE TABLE IF NOT EXISTS respostas (
+                chave TEXT PRIMARY KEY,
+                endpoint TEXT,
+                corpo BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                salvo_em REAL,
+                acessado_em REAL,
+                tamanho INTEGER
+            )"""
+        )
+        conexao.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acesso ON respostas (acessado_em)")
+
+    @staticmethod
+    def chave(url, params):
+        # Parâmetros normalizados: ordem e tipos (1 == "1") não alteram a chave
+        normalizados = sorted((str(k), str(v)) for k, v in (params or {}).items() if v is not None)
+        return hashlib.sha256(json.dumps([url, normalizados]).encode("utf-8")).hexdigest()
+
+    def ler(self, chave):
+        with self.lock:
+            linha = self.conexao.execute(
+                "SELECT corpo, etag, last_modified, salvo_em, endpoint FROM respostas WHERE chave = ?",
+                (chave,),
+            ).fetchone()
+            if linha is None:
+                return None
+            self.conexao.execute(
+                "UPDATE respostas SET acessado_em = ? WHERE chave = ?", (time.time(), chave)
+            )
+            self.conexao.commit()
+        corpo, etag, last_modified, salvo_em, endpoint = linha
+        return {
+            "corpo": zlib.decompress(corpo),
+            "etag": etag,
+            "last_modified": last_modified,
+            "salvo_em": salvo_em,
+            "endpoint": endpoint,
+        }
+
+    def expirado(self, entrada):
+        ttl = self.ttls.get(entrada["endpoint"], CACHE_TTL_PADRAO)
+        return time.time() - entrada["salvo_em"] > ttl
+
+    def salvar(self, chave, endpoint, corpo, etag=None, last_modified=None):
+        comprimido = zlib.compress(corpo)
+        agora = time.time()
+        with self.lock:
+            self.conexao.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (chave, endpoint, comprimido, etag, last_modified, agora, agora, len(comprimido)),
+            )
+            self.descartar_excedente()
+            self.conexao.commit()
+
+    def renovar(self, chave):
+        agora = time.time()
+        with self.lock:
+            self.conexao.execute(
+                "UPDATE respostas SET salvo_em = ?, acessado_em = ? WHERE chave = ?", (agora, agora, chave)
+            )
+            self.conexao.commit()
+
+    def descartar_excedente(self):
+        # Remove as entradas menos usadas recentemente até caber no tamanho máximo
+        total = self.conexao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+        if total <= self.tamanho_maximo:
+            return
+        remover = []
+        for chave, tamanho in self.conexao.execute(
+            "SELECT chave, tamanho FROM respostas ORDER BY acessado_em ASC"
+        ):
+            if total <= self.tamanho_maximo:
+                break
+            remover.append((chave,))
+            total -= tamanho
+        self.conexao.executemany("DELETE FROM respostas WHERE chave = ?", remover)
+
+    def limpar(self):
+        with self.lock:
+            self.conexao.execute("DELETE FROM respostas")
+            self.conexao.commit()
+            self.conexao.execute("VACUUM")
+
+class LimitadorTaxa:
+    # Token bucket compartilhado entre as threads: no máximo `taxa` requisições
+    # por segundo, com rajadas de até `capacidade` requisições
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = taxa
+        self.capacidade = capacidade or max(1.0, taxa)
+        self.tokens = self.capacidade
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def aguardar(self):
+        if not self.taxa:
+            return
+        while True:
+            with self.lock:
+                agora = time.monotonic()
+                self.tokens = min(self.capacidade, self.tokens + (agora - self.ultimo) * self.taxa)
+                self.ultimo = agora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.taxa
+            time.sleep(espera)
+
+class ClienteComprasGov:
+    # Sessão única (pool de conexões com keep-alive) usada por todas as consultas,
+    # com timeout, repetição com backoff exponencial + jitter em 429/5xx e
+    # limitador de taxa global
+    def __init__(
+        self,
+        timeout=(TIMEOUT_CONEXAO, TIMEOUT_LEITURA),
+        max_tentativas=MAX_TENTATIVAS,
+        backoff_base=BACKOFF_BASE,
+        backoff_maximo=BACKOFF_MAXIMO,
+        requisicoes_por_segundo=REQUISICOES_POR_SEGUNDO,
+        tamanho_pool=TAMANHO_POOL_CONEXOES,
+        cache=None,
+    ):
+        self.timeout = timeout
+        self.cache = cache
+        self.max_tentativas = max_tentativas
+        self.backoff_base = backoff_base
+        self.backoff_maximo = backoff_maximo
+        self.limitador = LimitadorTaxa(requisicoes_por_segundo)
+
+        self.sessao = requests.Session()
+        self.sessao.headers.update({"Accept": "application/json"})
+        adaptador = HTTPAdapter(pool_connections=tamanho_pool, pool_maxsize=tamanho_pool)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+
+    def tempo_espera(self, tentativa, resposta=None):
+        # "Full jitter": espera aleatória entre 0 e o backoff exponencial,
+        # respeitando o Retry-After enviado pelo servidor
+        espera = random.uniform(0, min(self.backoff_maximo, self.backoff_base * 2 ** tentativa))
+        if resposta is not None:
+            retry_after = resposta.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                espera = max(espera, min(self.backoff_maximo, float(retry_after)))
+        return espera
+
+    def get(self, url, params=None, headers=None):
+        for tentativa in range(self.max_tentativas):
+            ultima = tentativa == self.max_tentativas - 1
+            self.limitador.aguardar()
+            try:
+                r = self.sessao.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if ultima:
+                    raise
+                time.sleep(self.tempo_espera(tentativa))
+                continue
+            if r.status_code in STATUS_REPETIR and not ultima:
+                time.sleep(self.tempo_espera(tentativa, r))
+                continue
+            r.raise_for_status()
+            return r
+
+    def get_json(self, url, params=None, revalidar=False):
+        # revalidar=True ignora a validade da entrada e confirma com o servidor
+        # (requisição condicional) se ela continua atual
+        if self.cache is None:
+            return self.get(url, params=params).json()
+
+        chave = self.cache.chave(url, params)
+        entrada = self.cache.ler(chave)
+        if entrada and not revalidar and not self.cache.expirado(entrada):
+            return json.loads(entrada["corpo"])
+
+        # Entrada vencida: revalida com o servidor em vez de baixar tudo de novo
+        headers = {}
+        if entrada and entrada["etag"]:
+            headers["If-None-Match"] = entrada["etag"]
+        if entrada and entrada["last_modified"]:
+            headers["If-Modified-Since"] = entrada["last_modified"]
+        try:
+            r = self.get(url, params=params, headers=headers)
+        except requests.RequestException as erro:
+            if entrada is None:
+                raise
+            print(f"Usando cópia local vencida de {nome_endpoint(url)}: {erro}")
+            return json.loads(entrada["corpo"])
+
+        if r.status_code == 304 and entrada:
+            self.cache.renovar(chave)
+            return json.loads(entrada["corpo"])
+
+        data = r.json()
+        self.cache.salvar(
+            chave,
+            nome_endpoint(url),
+            r.content,
+            etag=r.headers.get("ETag"),
+            last_modified=r.headers.get("Last-Modified"),
+        )
+        return data
+
+cache_respostas = CacheRespostas(os.path.join(CACHE_DIR, "respostas.sqlite"))
+cliente = ClienteComprasGov(cache=cache_respostas)
+
+# =========================
+# PAGINAÇÃO DAS APIs
+# =========================
+TAMANHO_PAGINA = 500
+# Requisições simultâneas a um mesmo host em cada carga, somando todos os endpoints
+MAX_REQUISICOES_POR_HOST = int(os.environ.get("COMPRASGOV_MAX_REQUISICOES_POR_HOST", 8))
+
+def buscar_pagina(url, params, pagina, revalidar=False):
+    params_pagina = dict(params)
+    params_pagina["pagina"] = pagina
+    params_pagina.setdefault("tamanhoPagina", TAMANHO_PAGINA)
+    try:
+        return cliente.get_json(url, params=params_pagina, revalidar=revalidar)
+    except (requests.RequestException, ValueError) as erro:
+        print(f"Falha ao buscar página {pagina} de {url}: {erro}")
+        return None
+
+def total_de_paginas(data, tamanho_pagina):
+    total_paginas = data.get("totalPaginas")
+    if total_paginas:
+        return int(total_paginas)
+    total_registros = data.get("totalRegistros")
+    if total_registros:
+        return math.ceil(int(total_registros) / tamanho_pagina)
+    return 1
+
+async def buscar_todas_paginas(url, params, limites, falhas=None, revalidar=False, ao_ler_pagina=None):
+    # Lê a primeira página para descobrir o total e busca as demais em paralelo,
+    # devolvendo os registros de cada página à medida que ela chega. `limites`
+    # guarda um semáforo por host, compartilhado pelos endpoints da mesma carga.
+    # As páginas que falharem são anotadas em `falhas`, quando informado, e
+    # `ao_ler_pagina(lidas, total)` é chamado a cada página concluída
+    host = urlsplit(url).netloc
+    limite = limites.setdefault(host, asyncio.Semaphore(MAX_REQUISICOES_POR_HOST))
+
+    async def buscar(pagina):
+        async with limite:
+            # O cliente HTTP é síncrono (sessão, cache e limitador compartilhados),
+            # então cada página roda numa thread sem bloquear o laço de eventos
+            return pagina, await asyncio.to_thread(buscar_pagina, url, params, pagina, revalidar)
+
+    _, primeira = await buscar(1)
+    if not primeira:
+        if falhas is not None:
+            falhas.append(1)
+        return
+    total_paginas = total_de_paginas(primeira, params.get("tamanhoPagina", TAMANHO_PAGINA))
+    if ao_ler_pagina:
+        ao_ler_pagina(1, total_paginas)
+    yield primeira.get("resultado", [])
+
+    lidas = 1
+    for tarefa in asyncio.as_completed([buscar(pagina) for pagina in range(2, total_paginas + 1)]):
+        pagina, data = await tarefa
+        lidas += 1
+        if ao_ler_pagina:
+            ao_ler_pagina(lidas, total_paginas)
+        if data:
+            yield data.get("resultado", [])
+        elif falhas is not None:
+            falhas.append(pagina)
+
+# =========================
+# SINCRONIZAÇÃO INCREMENTAL
+# =========================
+DADOS_DIR = os.environ.get("COMPRASGOV_DADOS_DIR", CACHE_DIR)
+
+# Para cada endpoint: campo de data usado como marca d'água, parâmetros da API
+# que delimitam a janela de datas e campos que identificam o registro. Quando o
+# campo de data não é a data de publicação/inclusão, registros novos podem vir
+# com datas anteriores à marca: `reler_dias` relê esses dias antes dela
+SINCRONIZACAO = {
+    "contratos": {
+        "campo_data": "dataPublicacaoPncp",
+        "param_inicial": "dataPublicacaoPncpInicial",
+        "param_final": "dataPublicacaoPncpFinal",
+        "chave": ("numeroControlePNCP", "numeroControlePNCPCompra"),
+    },
+    "itens": {
+        "campo_data": "dataInclusaoPncp",
+        "param_inicial": "dataInclusaoPncpInicial",
+        "param_final": "dataInclusaoPncpFinal",
+        "chave": ("numeroControlePNCPCompra",),
+        "chave_item": "numeroItemCompra",
+    },
+    "atas": {
+        "campo_data": "dataVigenciaInicial",
+        "param_inicial": "dataVigenciaInicialMin",
+        "param_final": "dataVigenciaInicialMax",
+        "chave": ("numeroControlePncpAta",),
+        "reler_dias": 30,
+    },
+}
+# Campos numéricos de cada endpoint; os demais são guardados como texto
+CAMPOS_NUMERICOS = {
+    "contratos": ["valorTotalEstimado", "valorTotalHomologado", "codigoModalidade"],
+    "itens": [
+        "numeroItemCompra", "quantidade", "valorUnitarioEstimado", "valorTotal",
+        "valorUnitarioResultado", "valorTotalResultado",
+    ],
+    "atas": ["anoCompra", "valorTotal"],
+}
+
+def chave_registro(endpoint, registro):
+    config = SINCRONIZACAO[endpoint]
+    chave = next((registro[c] for c in config["chave"] if registro.get(c)), None)
+    if chave is None:
+        # Sem número de controle: usa o conteúdo do registro como identidade
+        return hashlib.sha1(json.dumps(registro, sort_keys=True).encode("utf-8")).hexdigest()
+    if "chave_item" in config:
+        return f"{chave}#{registro.get(config['chave_item'])}"
+    return str(chave)
+
+def como_texto(valor):
+    # Colunas não numéricas vão para o Parquet sempre como texto (ou nulo)
+    if valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    return str(valor)
+
+def janela_de(endpoint, params):
+    config = SINCRONIZACAO[endpoint]
+    return params.get(config["param_inicial"]), params.get(config["param_final"])
+
+class ArmazemColunar:
+    # Registros das APIs em Parquet, um arquivo por endpoint, UASG e mês
+    # (<dir>/<endpoint>/uasg=<codigo>/mes=<AAAA-MM>.parquet), com upsert pela chave
+    # do registro. Guarda também a marca d'água de cada par endpoint/UASG. Cada
+    # chave vive numa partição só: as chaves de cada arquivo ficam em memória,
+    # pela assinatura dele, para achar o registro que mudou de mês
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+        self.caminho_marcas = os.path.join(diretorio, "marcas.json")
+        self.lock = threading.Lock()
+        self.chaves = {}
+
+    def pasta(self, endpoint, uasg):
+        return os.path.join(self.diretorio, endpoint, f"uasg={uasg}")
+
+    def particoes(self, endpoint, uasg, data_inicial=None, data_final=None):
+        # Arquivos mensais da UASG que podem ter registros dentro da janela
+        pasta = self.pasta(endpoint, uasg)
+        if not os.path.isdir(pasta):
+            return []
+        caminhos = []
+        for arquivo in sorted(os.listdir(pasta)):
+            if not (arquivo.startswith("mes=") and arquivo.endswith(".parquet")):
+                continue
+            mes = arquivo[4:-8]
+            if mes != "sem-data" and (
+                (data_inicial and mes < data_inicial[:7]) or (data_final and mes > data_final[:7])
+            ):
+                continue
+            caminhos.append(os.path.join(pasta, arquivo))
+        return caminhos
+
+    def para_dataframe(self, endpoint, registros):
+        df = pd.DataFrame.from_records(registros)
+        for coluna in df.columns:
+            if coluna in CAMPOS_NUMERICOS[endpoint]:
+                df[coluna] = pd.to_numeric(df[coluna], errors="coerce")
+            else:
+                df[coluna] = df[coluna].map(como_texto)
+        df["_chave"] = [chave_registro(endpoint, r) for r in registros]
+        return df
+
+    def escrever(self, df, caminho):
+        temporario = caminho + ".tmp"
+        df.to_parquet(temporario, index=False)
+        os.replace(temporario, caminho)
+        estado = os.stat(caminho)
+        self.chaves[caminho] = ((estado.st_mtime_ns, estado.st_size), set(df["_chave"]))
+
+    def chaves_da_particao(self, caminho):
+        estado = os.stat(caminho)
+        assinatura = (estado.st_mtime_ns, estado.st_size)
+        guardado = self.chaves.get(caminho)
+        if guardado is None or guardado[0] != assinatura:
+            guardado = (assinatura, set(pd.read_parquet(caminho, columns=["_chave"])["_chave"]))
+            self.chaves[caminho] = guardado
+        return guardado[1]
+
+    @staticmethod
+    def iguais(a, b):
+        # Mesmos registros, em qualquer ordem (as linhas vêm do mesmo concat,
+        # então os tipos das colunas coincidem)
+        return a.sort_values("_chave", ignore_index=True).equals(b.sort_values("_chave", ignore_index=True))
+
+    def gravar(self, endpoint, uasg, registros):
+        # Mescla os registros nas partições mensais (o mais novo vence) e devolve
+        # a maior data gravada. Partição que não muda não é regravada: o mtime
+        # dela é a assinatura dos agregados e da referência de preços
+        if not registros:
+            return None
+        campo_data = SINCRONIZACAO[endpoint]["campo_data"]
+        novos = self.para_dataframe(endpoint, registros).drop_duplicates("_chave", keep="last")
+        if campo_data in novos.columns:
+            datas = novos[campo_data]
+        else:
+            datas = pd.Series(pd.NA, index=novos.index, dtype="string")
+        meses = datas.str[:7].fillna("sem-data")
+
+        pasta = self.pasta(endpoint, uasg)
+        os.makedirs(pasta, exist_ok=True)
+        with self.lock:
+            # Registro cuja data foi corrigida para outro mês sai da partição antiga
+            todas = set(novos["_chave"])
+            por_mes = {mes: set(chaves) for mes, chaves in novos["_chave"].groupby(meses)}
+            for caminho in self.particoes(endpoint, uasg):
+                mes = os.path.basename(caminho)[4:-8]
+                mudaram = (self.chaves_da_particao(caminho) & todas) - por_mes.get(mes, set())
+                if mudaram:
+                    df = pd.read_parquet(caminho)
+                    self.escrever(df.loc[~df["_chave"].isin(mudaram)], caminho)
+            for mes, grupo in novos.groupby(meses):
+                caminho = os.path.join(pasta, f"mes={mes}.parquet")
+                existentes = 0
+                if os.path.exists(caminho):
+                    anterior = pd.read_parquet(caminho)
+                    existentes = len(anterior)
+                    grupo = pd.concat([anterior, grupo], ignore_index=True)
+                mesclado = grupo.drop_duplicates("_chave", keep="last")
+                if existentes and len(mesclado) == existentes and self.iguais(grupo.iloc[:existentes], mesclado):
+                    continue
+                self.escrever(mesclado, caminho)
+        return datas.max() if datas.notna().any() else None
+
+    def remover_ausentes(self, endpoint, uasg, chaves, data_inicial=None, data_final=None):
+        # Depois de uma carga completa da janela, apaga o que a API não devolve mais
+        # e devolve as chaves apagadas
+        campo_data = SINCRONIZACAO[endpoint]["campo_data"]
+        removidas = []
+        with self.lock:
+            for caminho in self.particoes(endpoint, uasg, data_inicial, data_final):
+                df = pd.read_parquet(caminho)
+                datas = df[campo_data].fillna("") if campo_data in df.columns else pd.Series("", index=df.index)
+                na_janela = pd.Series(True, index=df.index)
+                if data_inicial:
+                    na_janela &= datas >= data_inicial
+                if data_final:
+                    na_janela &= datas.str[:10] <= data_final
+                remover = na_janela & ~df["_chave"].isin(chaves)
+                if remover.any():
+                    removidas.extend(df.loc[remover, "_chave"])
+                    self.escrever(df.loc[~remover], caminho)
+        return removidas
+
+    def ler_particao(self, endpoint, caminho, colunas=None, data_inicial=None, data_final=None):
+        # Uma partição mensal, só com as colunas pedidas e os registros da janela
+        campo_data = SINCRONIZACAO[endpoint]["campo_data"]
+        df = pd.read_parquet(caminho)
+        if colunas is not None:
+            df = df[[c for c in dict.fromkeys(list(colunas) + [campo_data]) if c in df.columns]]
+        if campo_data in df.columns:
+            datas = df[campo_data].fillna("")
+            if data_inicial:
+                df = df.loc[datas >= data_inicial]
+            if data_final:
+                df = df.loc[datas.loc[df.index].str[:10] <= data_final]
+        if colunas is not None:
+            df = df[[c for c in colunas if c in df.columns]]
+        return df
+
+    def ler(self, endpoint, uasg, colunas=None, data_inicial=None, data_final=None):
+        # Lê só as partições e colunas necessárias e aplica a janela de datas
+        caminhos = self.particoes(endpoint, uasg, data_inicial, data_final)
+        if not caminhos:
+            return pd.DataFrame(columns=colunas or [])
+        quadros = [self.ler_particao(endpoint, caminho, colunas, data_inicial, data_final) for caminho in caminhos]
+        return pd.concat(quadros, ignore_index=True)
+
+    def uasgs(self, endpoint):
+        # UASGs que têm registros do endpoint no armazém
+        pasta = os.path.join(self.diretorio, endpoint)
+        if not os.path.isdir(pasta):
+            return []
+        return sorted(nome[len("uasg="):] for nome in os.listdir(pasta) if nome.startswith("uasg="))
+
+    def marcas(self):
+        if not os.path.exists(self.caminho_marcas):
+            return {}
+        with open(self.caminho_marcas, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+
+    def marca(self, endpoint, uasg):
+        with self.lock:
+            return self.marcas().get(f"{endpoint}/{uasg}")
+
+    def atualizar_marca(self, endpoint, uasg, marca):
+        with self.lock:
+            marcas = self.marcas()
+            chave = f"{endpoint}/{uasg}"
+            marcas[chave] = max(marca, marcas.get(chave) or marca)
+            temporario = self.caminho_marcas + ".tmp"
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                json.dump(marcas, arquivo, indent=1)
+            os.replace(temporario, self.caminho_marcas)
+
+armazem = ArmazemColunar(os.path.join(DADOS_DIR, "colunar"))
+
+# =========================
+# ÍNDICE DE BUSCA TEXTUAL
+# =========================
+# Campos que identificam cada registro nos resultados e campos de texto indexados
+CAMPOS_BUSCA = {
+    "contratos": {"rotulo": ["numeroCompra"], "texto": ["objetoCompra"]},
+    "itens": {
+        "rotulo": ["numeroControlePNCPCompra", "numeroItemCompra"],
+        "texto": ["descricaoResumida", "descricaodetalhada"],
+    },
+    "atas": {"rotulo": ["numeroAtaRegistroPreco"], "texto": ["objeto"]},
+}
+TIPOS_BUSCA = {"contratos": "Contrato", "itens": "Item", "atas": "Ata"}
+COLUNAS_RESULTADO_BUSCA = ["Tipo", "Identificação", "Data", "Trecho"]
+
+def como_rotulo(serie):
+    if pd.api.types.is_numeric_dtype(serie):
+        serie = pd.to_numeric(serie, errors="coerce").astype("Int64")
+    return serie.astype("string").fillna("")
+
+class IndiceBusca(BancoLocal):
+    # Índice invertido (SQLite FTS5) sobre Objeto e descrições, sem distinção de
+    # acentos e maiúsculas. É atualizado junto com o armazém: cada página gravada
+    # é indexada e cada registro apagado sai do índice. O id de cada documento
+    # vem do hash de endpoint/UASG/chave, então regravar um registro o substitui
+    def __init__(self, caminho):
+        super().__init__(caminho, timeout=30)
+
+    def criar_tabelas(self, conexao):
+        conexao.execute(
+            """CREATE TABLE IF NOT EXISTS registros (
+                id INTEGER PRIMARY KEY,
+                endpoint TEXT,
+                uasg TEXT,
+                rotulo TEXT,
+                data TEXT
+            )"""
+        )
+        conexao.execute("CREATE INDEX IF NOT EXISTS idx_registros_uasg ON registros (endpoint, uasg)")
+        conexao.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documentos "
+            "USING fts5(texto, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    @staticmethod
+    def identificador(endpoint, uasg, chave):
+        resumo = hashlib.sha1(f"{endpoint}/{uasg}/{chave}".encode("utf-8")).digest()
+        return int.from_bytes(resumo[:8], "big", signed=True)
+
+    def indexar(self, endpoint, uasg, df):
+        # df no formato do armazém (campos da API e a coluna _chave)
+        if df.empty:
+            return
+        campos = CAMPOS_BUSCA[endpoint]
+        campo_data = SINCRONIZACAO[endpoint]["campo_data"]
+        df = df.reindex(columns=dict.fromkeys(["_chave", campo_data] + campos["rotulo"] + campos["texto"]))
+        ids = [self.identificador(endpoint, uasg, chave) for chave in df["_chave"]]
+        rotulos = como_rotulo(df[campos["rotulo"][0]])
+        for campo in campos["rotulo"][1:]:
+            rotulos = rotulos + " #" + como_rotulo(df[campo])
+        textos = df[campos["texto"]].fillna("").astype(str).agg(" ".join, axis=1)
+        datas = df[campo_data].astype("string").str[:10]
+        with self.lock:
+            self.conexao.executemany("DELETE FROM documentos WHERE rowid = ?", [(i,) for i in ids])
+            self.conexao.executemany(
+                "INSERT INTO documentos (rowid, texto) VALUES (?, ?)", zip(ids, textos)
+            )
+            self.conexao.executemany(
+                "INSERT OR REPLACE INTO registros VALUES (?, ?, ?, ?, ?)",
+                [(i, endpoint, uasg, r, d if isinstance(d, str) else None)
+                 for i, r, d in zip(ids, rotulos, datas)],
+            )
+            self.conexao.commit()
+
+    def remover(self, endpoint, uasg, chaves):
+        ids = [(self.identificador(endpoint, uasg, chave),) for chave in chaves]
+        if not ids:
+            return
+        with self.lock:
+            self.conexao.executemany("DELETE FROM documentos WHERE rowid = ?", ids)
+            self.conexao.executemany("DELETE FROM registros WHERE id = ?", ids)
+            self.conexao.commit()
+
+    def tem(self, endpoint, uasg):
+        with self.lock:
+            return self.conexao.execute(
+                "SELECT 1 FROM registros WHERE endpoint = ? AND uasg = ? LIMIT 1", (endpoint, uasg)
+            ).fetchone() is not None
+
+    def reconstruir(self, endpoint, uasg):
+        # Indexa o que já está no armazém (dados gravados antes de existir o índice)
+        for caminho in armazem.particoes(endpoint, uasg):
+            self.indexar(endpoint, uasg, armazem.ler_particao(endpoint, caminho))
+
+    def buscar(self, uasg, consulta, limite=50):
+        # Todos os termos precisam aparecer; o último vale como prefixo, para a
+        # busca funcionar enquanto a palavra é digitada. Ordenado por relevância (BM25)
+        termos = re.findall(r"\w+", consulta or "")
+        if not termos:
+            return pd.DataFrame(columns=COLUNAS_RESULTADO_BUSCA)
+        expressao = " ".join(f'"{termo}"' for termo in termos) + "*"
+        with self.lock:
+            linhas = self.conexao.execute(
+                """SELECT r.endpoint, r.rotulo, r.data,
+                          snippet(documentos, 0, '**', '**', '…', 16)
+                   FROM documentos JOIN registros r ON r.id = documentos.rowid
+                   WHERE documentos MATCH ? AND r.uasg = ?
+                   ORDER BY documentos.rank
+                   LIMIT ?""",
+                (expressao, uasg, limite),
+            ).fetchall()
+        resultado = pd.DataFrame(linhas, columns=COLUNAS_RESULTADO_BUSCA)
+        resultado["Tipo"] = resultado["Tipo"].map(TIPOS_BUSCA)
+        return resultado
+
+indice_busca = IndiceBusca(os.path.join(DADOS_DIR, "busca.sqlite"))
+
+async def sincronizar(endpoint, url, params, uasg, limites, incremental=True, revalidar=False,
+                      ao_ler_pagina=None):
+    # Grava no armazém local o que a API tem para a janela. No modo incremental
+    # busca só o que é mais novo que a marca d'água (ou a janela inteira na
+    # primeira vez); no modo completo também apaga o que sumiu da API. Devolve
+    # quantos registros gravou, ou None se alguma página falhou
+    config = SINCRONIZACAO[endpoint]
+    data_inicial, data_final = janela_de(endpoint, params)
+    if not indice_busca.tem(endpoint, uasg):
+        await asyncio.to_thread(indice_busca.reconstruir, endpoint, uasg)
+
+    params_delta = dict(params)
+    marca = armazem.marca(endpoint, uasg) if incremental else None
+    if marca:
+        # A marca entra na janela (mesmo dia) para não perder registros do mesmo
+        # dia. Nunca passa do fim da janela: uma data futura (vigência que ainda
+        # vai começar) não pode suspender as próximas sincronizações
+        inicio = marca[:10]
+        if config.get("reler_dias"):
+            inicio = (datetime.fromisoformat(inicio) - timedelta(days=config["reler_dias"])).strftime("%Y-%m-%d")
+        if data_final:
+            inicio = min(inicio, data_final)
+        params_delta[config["param_inicial"]] = max(inicio, data_inicial or inicio)
+
+    if data_final and params_delta[config["param_inicial"]] > data_final:
+        return 0
+
+    falhas = []
+    registros = []
+    async for pagina in buscar_todas_paginas(url, params_delta, limites, falhas, revalidar, ao_ler_pagina):
+        registros.extend(pagina)
+    maior_data = await asyncio.to_thread(armazem.gravar, endpoint, uasg, registros)
+    if registros:
+        await asyncio.to_thread(indice_busca.indexar, endpoint, uasg, armazem.para_dataframe(endpoint, registros))
+
+    # As páginas chegam fora de ordem: a marca só avança (e a limpeza só acontece)
+    # se nenhuma página falhou, senão os registros perdidos seriam pulados/apagados
+    if falhas:
+        print(f"Sincronização de {endpoint} incompleta (páginas {sorted(falhas)}); marca mantida.")
+        return None
+    if maior_data:
+        armazem.atualizar_marca(endpoint, uasg, min(maior_data, data_final) if data_final else maior_data)
+    if not marca:
+        chaves = {chave_registro(endpoint, r) for r in registros}
+        removidas = await asyncio.to_thread(
+            armazem.remover_ausentes, endpoint, uasg, chaves, data_inicial, data_final
+        )
+        await asyncio.to_thread(indice_busca.remover, endpoint, uasg, removidas)
+    return len(registros)
+
+def buscar_registros(endpoint, params, uasg):
+    # O armazém colunar é a fonte dos dados do painel: devolve o DataFrame dos
+    # registros da janela lido de lá (a ingestão já sincronizou o armazém)
+    data_inicial, data_final = janela_de(endpoint, params)
+    return armazem.ler(endpoint, uasg, data_inicial=data_inicial, data_final=data_final)
+
+# =========================
+# AGREGADOS MATERIALIZADOS
+# =========================
+# Rollups de cada endpoint: nome -> (colunas de agrupamento, colunas somadas).
+# "mes" é o AAAA-MM do campo de data do endpoint. Todo rollup tem também a
+# contagem de registros do grupo
+ROLLUPS = {
+    "contratos": {
+        "mes": (["mes"], ["valorTotalEstimado", "valorTotalHomologado"]),
+    },
+    "itens": {
+        "catmat": (["codItemCatalogo"], ["valorTotalResultado"]),
+        "status": (["situacaoCompraItemNome"], ["valorTotalResultado"]),
+        "fornecedor": (["codFornecedor", "nomeFornecedor"], ["valorTotalResultado"]),
+        # Histogramas dos preços unitários (ver REFERÊNCIA DE PREÇOS POR CATMAT)
+        "preco_final": (["codItemCatalogo", "mes", "faixaPrecoFinal"], []),
+        "preco_estimado": (["codItemCatalogo", "mes", "faixaPrecoEstimado"], []),
+    },
+}
+
+# Preços unitários entram nos rollups pela faixa logarítmica em que caem. Faixas
+# consecutivas crescem por um fator GAMA_PRECOS, então o preço representativo de
+# cada faixa erra no máximo ERRO_RELATIVO_PRECOS; contagens por faixa são
+# somáveis entre partições como qualquer outro rollup
+ERRO_RELATIVO_PRECOS = 0.01
+GAMA_PRECOS = (1 + ERRO_RELATIVO_PRECOS) / (1 - ERRO_RELATIVO_PRECOS)
+
+def faixa_de_preco(valores):
+    valores = pd.to_numeric(valores, errors="coerce").astype("float64")
+    return np.ceil(np.log(valores.where(valores > 0)) / np.log(GAMA_PRECOS)).astype("Int64")
+
+def preco_da_faixa(faixas):
+    return 2 * GAMA_PRECOS ** np.asarray(faixas, dtype="float64") / (GAMA_PRECOS + 1)
+
+# Colunas calculadas na leitura da partição: nome -> (campo de origem, função)
+COLUNAS_DERIVADAS = {
+    "faixaPrecoFinal": ("valorUnitarioResultado", faixa_de_preco),
+    "faixaPrecoEstimado": ("valorUnitarioEstimado", faixa_de_preco),
+}
+
+def somar_grupos(quadros, agrupar, somar):
+    quadros = [df for df in quadros if not df.empty]
+    if not quadros:
+        # Vazio, mas com as somas numéricas: cumsum/quantis sobre ele não quebram
+        vazio = pd.DataFrame(columns=agrupar)
+        for coluna in somar:
+            vazio[coluna] = pd.Series(dtype="float64")
+        vazio["registros"] = pd.Series(dtype="int64")
+        return vazio
+    df = pd.concat(quadros, ignore_index=True)
+    if "registros" not in df.columns:
+        df["registros"] = 1
+    return df.groupby(agrupar, dropna=False)[somar + ["registros"]].sum().reset_index()
+
+class AgregadosMaterializados:
+    # Rollups parciais de cada partição mensal do armazém, guardados em memória
+    # pela assinatura do arquivo (mtime e tamanho). Uma sincronização que regrava
+    # só alguns meses faz recalcular só esses meses; o rollup da UASG é a soma
+    # dos parciais, com poucas centenas de linhas
+    def __init__(self, armazem):
+        self.armazem = armazem
+        self.parciais = {}
+        self.lock = threading.Lock()
+
+    def parcial(self, endpoint, caminho, data_inicial=None, data_final=None):
+        # Guardado por partição e janela: o painel lê a janela da UASG e a
+        # referência de preços lê o histórico inteiro das mesmas partições
+        estado = os.stat(caminho)
+        assinatura = (estado.st_mtime_ns, estado.st_size)
+        with self.lock:
+            guardado = self.parciais.get((caminho, data_inicial, data_final))
+        if guardado is not None and guardado[0] == assinatura:
+            return guardado[1]
+
+        rollups = ROLLUPS[endpoint]
+        colunas = {c for agrupar, somar in rollups.values() for c in agrupar + somar} - {"mes"}
+        derivadas = {nome: COLUNAS_DERIVADAS[nome] for nome in colunas & set(COLUNAS_DERIVADAS)}
+        colunas = (colunas - set(derivadas)) | {origem for origem, _ in derivadas.values()}
+        campo_data = SINCRONIZACAO[endpoint]["campo_data"]
+        df = self.armazem.ler_particao(endpoint, caminho, colunas | {campo_data}, data_inicial, data_final)
+        df = df.reindex(columns=sorted(colunas | {campo_data}))
+        df["mes"] = df[campo_data].str[:7]
+        for nome_campo in CAMPOS_NUMERICOS[endpoint]:
+            if nome_campo in df.columns:
+                df[nome_campo] = pd.to_numeric(df[nome_campo], errors="coerce").astype("float64")
+        for nome, (origem, funcao) in derivadas.items():
+            df[nome] = funcao(df[origem])
+        resultado = {
+            nome: somar_grupos([df], agrupar, somar) for nome, (agrupar, somar) in rollups.items()
+        }
+        with self.lock:
+            self.parciais[(caminho, data_inicial, data_final)] = (assinatura, resultado)
+        return resultado
+
+    def calcular(self, endpoint, uasg, data_inicial=None, data_final=None):
+        parciais = [
+            self.parcial(endpoint, caminho, data_inicial, data_final)
+            for caminho in self.armazem.particoes(endpoint, uasg, data_inicial, data_final)
+        ]
+        return {
+            nome: somar_grupos([p[nome] for p in parciais], agrupar, somar)
+            for nome, (agrupar, somar) in ROLLUPS[endpoint].items()
+        }
+
+agregados = AgregadosMaterializados(armazem)
 
 # =========================
 # Buscar UASGs pelo CNPJ
 # =========================
-def buscar_uasgs(cnpj="00394502000144"):
-    url = "https://dadosabertos.compras.gov.br/modulo-uasg/1_consultarUasg"
+CNPJ_PADRAO = "00394502000144"
+
+def buscar_uasgs(cnpj=CNPJ_PADRAO):
+    url = f"{API_BASE_URL}/modulo-uasg/1_consultarUasg"
     params = {"cnpjCpfOrgao": cnpj, "statusUasg": True}
-    r = requests.get(url, params=params)
-    if r.status_code == 200:
-        data = r.json()
-        return data.get("resultado", [])
-    return []
+    try:
+        data = cliente.get_json(url, params=params)
+    except (requests.RequestException, ValueError) as erro:
+        print(f"Falha ao buscar UASGs do CNPJ {cnpj}: {erro}")
+        return []
+    return data.get("resultado", [])
 
 # =========================
 # JANELA DE SELEÇÃO DE UASG
 # =========================
-def selecionar_uasg():
-    uasgs = buscar_uasgs()
+def selecionar_uasg(cnpj=CNPJ_PADRAO):
+    uasgs = buscar_uasgs(cnpj)
     if not uasgs:
         print("Nenhuma UASG encontrada para este CNPJ.")
         return None, None
@@ -100,7 +1010,7 @@ def selecionar_uasg():
     root,
     text=(
         "Após clicar em confirmar, o programa fará requisição no Banco de Dados do Governo Federal, "
-        "por favor aguarde. Isso pode levar alguns segundos."
+        "por favor aguarde. O andamento da carga aparece na janela seguinte."
     ),
     font=("Arial", 12),
     wraplength=550,  # largura máxima em pixels antes de quebrar linha
@@ -124,614 +1034,2073 @@ def selecionar_uasg():
     return selecionada["codigo"], selecionada["nome"]
 
 # =========================
-# SELECIONAR AQUI ANTES DO DASHBOARD
+# ARGUMENTOS DE LINHA DE COMANDO
 # =========================
-codigo, nome = selecionar_uasg()
+def interpretar_argumentos(argv=None, tolerante=False):
+    # Opção desconhecida encerra com erro; tolerante=True (wsgi.py) só avisa e ignora
+    parser_args = argparse.ArgumentParser(description="Dashboard de Contratações Públicas (PNCP)")
+    parser_args.add_argument(
+        "--sem-cache", action="store_true",
+        help="ignora o cache local e consulta sempre as APIs",
+    )
+    parser_args.add_argument(
+        "--limpar-cache", action="store_true",
+        help="apaga o cache local antes de carregar os dados",
+    )
+    parser_args.add_argument(
+        "--incremental", action="store_true",
+        help="busca só os registros mais novos que a última sincronização e mescla no armazém local",
+    )
+    parser_args.add_argument(
+        "--intervalo-atualizacao", type=float, default=30,
+        help="intervalo, em minutos, entre as atualizações automáticas dos dados (padrão: 30)",
+    )
+    parser_args.add_argument(
+        "--cnpj", default=CNPJ_PADRAO,
+        help="CNPJ do órgão cujas UASGs aparecem no seletor do painel",
+    )
+    parser_args.add_argument(
+        "--max-uasgs-memoria", type=int, default=20,
+        help="quantidade máxima de UASGs mantidas em memória ao mesmo tempo (padrão: 20)",
+    )
+    parser_args.add_argument(
+        "--uasg",
+        help="UASG exibida ao abrir o painel (sem ela, a janela de seleção é aberta no modo desktop)",
+    )
+    parser_args.add_argument(
+        "--host", default="0.0.0.0",
+        help="endereço em que o servidor escuta (padrão: 0.0.0.0)",
+    )
+    parser_args.add_argument(
+        "--port", type=int, default=8050,
+        help="porta do servidor (padrão: 8050)",
+    )
+    parser_args.add_argument(
+        "--workers", type=int, default=1,
+        help="processos do servidor; acima de 1 o painel é servido pelo gunicorn (padrão: 1)",
+    )
+    parser_args.add_argument(
+        "--cache-compartilhado", default=os.environ.get("COMPRASGOV_CACHE_COMPARTILHADO"),
+        help="onde os processos compartilham os snapshots: memoria, arquivos ou uma URL redis:// "
+             "(padrão: memoria com um processo, arquivos com --workers maior que 1 ou pelo wsgi.py)",
+    )
+    parser_args.add_argument(
+        "--backfill", nargs=2, metavar=("INICIO", "FIM"),
+        help="carrega no armazém o histórico entre dois meses (AAAA-MM) da --uasg ou de todas as UASGs do "
+             "--cnpj, em janelas mensais, e sai; uma carga interrompida continua de onde parou",
+    )
+    parser_args.add_argument(
+        "--alertas", action="store_true",
+        help="avisa quando atas do armazém chegam a 180, 90 e 30 dias do fim da vigência",
+    )
+    parser_args.add_argument(
+        "--intervalo-alertas", type=float, default=60,
+        help="intervalo, em minutos, entre as avaliações dos alertas (padrão: 60)",
+    )
+    parser_args.add_argument(
+        "--alerta-webhook", default=os.environ.get("COMPRASGOV_ALERTA_WEBHOOK"),
+        help="URL que recebe os alertas em um POST JSON",
+    )
+    parser_args.add_argument(
+        "--alerta-email", default=os.environ.get("COMPRASGOV_ALERTA_EMAIL"),
+        help="destinatários dos alertas por e-mail, separados por vírgula (servidor em COMPRASGOV_SMTP_HOST)",
+    )
+    parser_args.add_argument(
+        "--sem-janela", action="store_true",
+        help="roda só o servidor, sem as janelas do Tkinter (automático quando não há interface gráfica)",
+    )
+    if not tolerante:
+        return parser_args.parse_args(argv)
+    argumentos, ignorados = parser_args.parse_known_args(argv)
+    if ignorados:
+        print(f"Opções ignoradas: {' '.join(ignorados)}")
+    return argumentos
 
-# Configurar idioma para português
-locale.setlocale(locale.LC_TIME, "pt_BR.UTF-8")
+# Configuração padrão até create_app receber a configuração de verdade
+argumentos = interpretar_argumentos([])
 
 # =========================
-# API 1 - CONTRATOS (com paginação)
+# NORMALIZAÇÃO DOS REGISTROS
 # =========================
-url_contratos = "https://dadosabertos.compras.gov.br/modulo-contratacoes/1_consultarContratacoes_PNCP_14133"
-params_contratos = {
-    "pagina": 1,
-    "tamanhoPagina": 500,
-    "unidadeOrgaoCodigoUnidade": codigo,
-    "dataPublicacaoPncpInicial": "2025-01-01",
-    "dataPublicacaoPncpFinal": "2025-12-31",
-    "codigoModalidade": 6,
+# Campo da API -> coluna exibida no painel, na ordem das tabelas
+COLUNAS_CONTRATOS = {
+    "numeroCompra": "Número da Compra",
+    "numeroControlePNCP": "Número de Controle PNCP",
+    "objetoCompra": "Objeto",
+    "processo": "Processo NUP",
+    "unidadeOrgaoCodigoUnidade": "Unidade Gestora",
+    "unidadeOrgaoNomeUnidade": "Nome da Unidade Gestora",
+    "dataPublicacaoPncp": "Data Publicação PNCP",
+    "valorTotalEstimado": "Valor Total Estimado",
+    "valorTotalHomologado": "Valor Total Homologado",
+}
+COLUNAS_ITENS = {
+    "numeroControlePNCPCompra": "Id da Compra",
+    "dataInclusaoPncp": "Data Publicação PNCP",
+    "numeroItemCompra": "Número do Item",
+    "situacaoCompraItemNome": "Status do item",
+    "codItemCatalogo": "CATMAT/CATSER",
+    "descricaoResumida": "Descrição Resumida",
+    "descricaodetalhada": "Descrição Detalhada",
+    "quantidade": "Quantidade",
+    "valorUnitarioEstimado": "Valor Unitário Estimado",
+    "valorTotal": "Valor Total Estimado",
+    "valorUnitarioResultado": "Valor Unitário Final",
+    "valorTotalResultado": "Valor Total Final",
+    "nomeFornecedor": "Nome do Vencedor",
+    "codFornecedor": "CNPJ do Vencedor",
+}
+COLUNAS_ATAS = {
+    "numeroAtaRegistroPreco": "Número da Ata",
+    "codigoUnidadeGerenciadora": "Unidade Gerenciadora",
+    "numeroCompra": "Número de Compra",
+    "anoCompra": "Ano da Compra",
+    "dataAssinatura": "Data da Assinatura",
+    "dataVigenciaInicial": "Vigência Inicial",
+    "dataVigenciaFinal": "Vigência Final",
+    "valorTotal": "Valor Total",
+    "objeto": "Objeto",
+    "numeroControlePncpAta": "Número de Controle da Ata",
+    "numeroControlePncpCompra": "Número de Controle PNCP",
+    "idCompra": "Id da Compra",
 }
-# A lista que vai dar origem ao dataframe:
-
-contratos_list = []
-
-response1 = requests.get(url_contratos, params=params_contratos)
 
-if response1.status_code == 200:
-    data = response1.json()
-    resultados = data.get("resultado", [])
+# =========================
+# ESQUEMA DAS TABELAS
+# =========================
+# Tipos aplicados na ingestão. Textos que se repetem muito (status, fornecedor,
+# CATMAT, UASG, compra) viram categorias: cada valor é guardado uma vez e os
+# agrupamentos e filtros trabalham sobre códigos inteiros. Valores viram
+# float64 com NaN de verdade e contagens viram inteiros anuláveis
+ESQUEMA_ITENS = {
+    "Id da Compra": "category",
+    "Número do Item": "Int64",
+    "Status do item": "category",
+    "CATMAT/CATSER": "category",
+    "Quantidade": "float64",
+    "Valor Unitário Estimado": "float64",
+    "Valor Total Estimado": "float64",
+    "Valor Unitário Final": "float64",
+    "Valor Total Final": "float64",
+    "Nome do Vencedor": "category",
+    "CNPJ do Vencedor": "category",
+}
+ESQUEMA_ATAS = {
+    "Unidade Gerenciadora": "category",
+    "Ano da Compra": "Int64",
+    "Valor Total": "float64",
+}
 
-    for contrato in resultados:
-# FORMATANDO A DATA:
-        data_iso = contrato.get("dataPublicacaoPncp", None)
-        if data_iso:
-            try:
-                data_obj = parser.isoparse(data_iso)
-                data_formatada = data_obj
-            except:
-                data_formatada = "N/A"
+def aplicar_esquema(tabela, esquema):
+    for coluna, tipo in esquema.items():
+        serie = tabela[coluna]
+        if tipo == "category":
+            if pd.api.types.is_numeric_dtype(serie):
+                # Códigos numéricos (CATMAT, UASG) viram texto sem o ".0" dos floats
+                serie = pd.to_numeric(serie, errors="coerce").astype("Int64")
+            tabela[coluna] = serie.astype("string").astype("category")
         else:
-            data_formatada = "N/A"
-####
-        contratos_list.append(
-            {
-                "Número da Compra": contrato.get("numeroCompra", "N/A"),
-                "Objeto": contrato.get("objetoCompra", "N/A"),
-                "Processo NUP": contrato.get("processo", "N/A"),
-                "Unidade Gestora": contrato.get("unidadeOrgaoCodigoUnidade", "N/A"),
-                "Nome da Unidade Gestora": contrato.get("unidadeOrgaoNomeUnidade", "N/A"),
-                "Data Publicação PNCP": data_formatada,
-                "Valor Total Estimado": contrato.get("valorTotalEstimado", "N/A"),
-                "Valor Total Homologado": contrato.get("valorTotalHomologado", "N/A"),
-            }
-        )
+            tabela[coluna] = pd.to_numeric(serie, errors="coerce").astype(tipo)
+    return tabela
+
+def normalizar_registros(registros, colunas, colunas_data=(), esquema=None):
+    # Monta a tabela do painel de uma vez só a partir dos registros brutos:
+    # seleciona e renomeia as colunas pelo mapa (campos ausentes viram nulos),
+    # converte as datas vetorialmente e aplica o esquema. As datas continuam
+    # datetime; a formatação para exibição acontece só na hora de montar a página
+    tabela = registros.reindex(columns=list(colunas)).rename(columns=colunas)
+    for coluna in colunas_data:
+        tabela[coluna] = pd.to_datetime(tabela[coluna], format="ISO8601", utc=True, errors="coerce")
+    return aplicar_esquema(tabela, esquema or {})
+
+def relatorio_memoria(snapshot):
+    # Linhas e memória (com o conteúdo dos textos) de cada tabela do snapshot
+    return pd.DataFrame(
+        [
+            {"Tabela": chave, "Linhas": len(df), "MB": df.memory_usage(deep=True).sum() / 2**20}
+            for chave, df in snapshot.items()
+            if isinstance(df, pd.DataFrame)
+        ],
+        columns=["Tabela", "Linhas", "MB"],
+    )
 
-tabela_contratos = pd.DataFrame(contratos_list)
+# =========================
+# DERIVAÇÃO DAS COLUNAS DE CONTRATOS
+# =========================
+ESQUEMA_CONTRATOS = {
+    "Unidade Gestora": "category",
+    "Nome da Unidade Gestora": "category",
+    "Valor Total Estimado": "float64",
+    "Valor Total Homologado": "float64",
+    "Diferença Nominal": "float64",
+    "% Desconto": "float64",
+}
 
-if not tabela_contratos.empty:
-    # 🔹 Converter colunas numéricas
-    if "Valor Total Estimado" in tabela_contratos.columns:
-        tabela_contratos["Valor Total Estimado"] = pd.to_numeric(
-            tabela_contratos["Valor Total Estimado"], errors="coerce"
-        )
-    if "Valor Total Homologado" in tabela_contratos.columns:
-        tabela_contratos["Valor Total Homologado"] = pd.to_numeric(
-            tabela_contratos["Valor Total Homologado"], errors="coerce"
-        )
+def derivar_contratos(tabela_contratos):
+    # Etapa única e vetorizada: tipa os valores, calcula Diferença Nominal e
+    # % Desconto (0 quando o estimado é 0 ou nulo) e ordena pela publicação.
+    # Altera e devolve o próprio DataFrame recebido, sem cópias intermediárias
+    estimado = pd.to_numeric(tabela_contratos["Valor Total Estimado"], errors="coerce").astype("float64")
+    homologado = pd.to_numeric(tabela_contratos["Valor Total Homologado"], errors="coerce").astype("float64")
+    diferenca = estimado - homologado
+
+    valido = estimado.notna() & estimado.ne(0)
+    desconto = np.where(valido, diferenca / estimado.where(valido) * 100, 0.0)
+
+    tabela_contratos["Valor Total Estimado"] = estimado
+    tabela_contratos["Valor Total Homologado"] = homologado
+    tabela_contratos["Diferença Nominal"] = diferenca
+    tabela_contratos["% Desconto"] = pd.Series(desconto, index=tabela_contratos.index).round(2)
+    tabela_contratos["% Desconto_fmt"] = tabela_contratos["% Desconto"].astype(str) + " %"
+    tabela_contratos = aplicar_esquema(tabela_contratos, ESQUEMA_CONTRATOS)
 
-    # Criar colunas derivadas
-    tabela_contratos["Diferença Nominal"] = (
-        tabela_contratos["Valor Total Estimado"] - tabela_contratos["Valor Total Homologado"]
-    )
-    tabela_contratos["% Desconto"] = pd.to_numeric(
-        tabela_contratos["Diferença Nominal"] / tabela_contratos["Valor Total Estimado"] * 100
-    )
-    tabela_contratos["% Desconto"] = tabela_contratos["% Desconto"].round(2).astype(str) + " %"
+    return tabela_contratos.sort_values(
+        by="Data Publicação PNCP", ascending=False
+    ).reset_index(drop=True)
 
-else:
-    # Garante que as colunas existam mesmo se não houver dados
-    tabela_contratos = pd.DataFrame(columns=[
-        "Número da Compra", "Objeto", "Processo NUP",
-        "Unidade Gestora", "Nome da Unidade Gestora",
-        "Data Publicação PNCP", "Valor Total Estimado",
-        "Valor Total Homologado", "Diferença Nominal", "% Desconto"
-    ])
+# =========================
+# API 1 - CONTRATOS (com paginação)
+# =========================
+url_contratos = f"{API_BASE_URL}/modulo-contratacoes/1_consultarContratacoes_PNCP_14133"
 
+def parametros_contratos(codigo):
+    return {
+        "pagina": 1,
+        "tamanhoPagina": 500,
+        "unidadeOrgaoCodigoUnidade": codigo,
+        "dataPublicacaoPncpInicial": "2025-01-01",
+        "dataPublicacaoPncpFinal": "2025-12-31",
+        "codigoModalidade": 6,
+    }
 
-# 🔹 Criar colunas de diferença e desconto
-tabela_contratos["Diferença Nominal"] = (
-    tabela_contratos["Valor Total Estimado"] - tabela_contratos["Valor Total Homologado"]
-)
+def carregar_contratos(codigo):
+    params_contratos = parametros_contratos(codigo)
+    registros = buscar_registros("contratos", params_contratos, codigo)
+    tabela_contratos = normalizar_registros(registros, COLUNAS_CONTRATOS, ["Data Publicação PNCP"])
+    return derivar_contratos(tabela_contratos)
 
-tabela_contratos["% Desconto"] = (tabela_contratos["Diferença Nominal"] / tabela_contratos["Valor Total Estimado"] * 100
-)
 
-if not tabela_contratos.empty:
-    # 🔹 Garantir que as colunas numéricas estejam corretas
-    tabela_contratos["Valor Total Estimado"] = pd.to_numeric(
-        tabela_contratos["Valor Total Estimado"], errors="coerce"
-    )
-    tabela_contratos["Valor Total Homologado"] = pd.to_numeric(
-        tabela_contratos["Valor Total Homologado"], errors="coerce"
-    )
+# =========================
+# API 2 - ITENS CONTRATADOS
+# =========================
+url_itens = f"{API_BASE_URL}/modulo-contratacoes/2_consultarItensContratacoes_PNCP_14133"
 
-    # 🔹 Calcular Diferença Nominal
-    tabela_contratos["Diferença Nominal"] = (
-        tabela_contratos["Valor Total Estimado"] - tabela_contratos["Valor Total Homologado"]
-    )
+def parametros_itens(codigo):
+    return {
+        "pagina": 1,
+        "tamanhoPagina": 500,
+        "unidadeOrgaoCodigoUnidade": codigo,
+        "dataInclusaoPncpInicial": "2025-01-01",
+        "dataInclusaoPncpFinal": "2025-12-31",
+        "codigoModalidade": 6,
+    }
 
-    # 🔹 Calcular % Desconto de forma segura
-    tabela_contratos["% Desconto"] = tabela_contratos.apply(
-        lambda row: (row["Diferença Nominal"] / row["Valor Total Estimado"] * 100)
-        if row["Valor Total Estimado"] not in [0, None, float('nan')] else 0,
-        axis=1
-    )
+def carregar_itens(codigo):
+    params_itens = parametros_itens(codigo)
 
-    # 🔹 Arredondar e criar coluna formatada
-    tabela_contratos["% Desconto"] = tabela_contratos["% Desconto"].round(2)
-    tabela_contratos["% Desconto_fmt"] = tabela_contratos["% Desconto"].astype(str) + " %"
+    registros = buscar_registros("itens", params_itens, codigo)
+    tabela_itens = normalizar_registros(registros, COLUNAS_ITENS, ["Data Publicação PNCP"], ESQUEMA_ITENS)
 
-    tabela_contratos_1 = tabela_contratos.copy()
+    return tabela_itens
 
-    # 🔹 Agregação por mês
-    tabela_contratos_mes = (
-        tabela_contratos_1.groupby(tabela_contratos_1["Data Publicação PNCP"].dt.to_period("M"))[
-            "Valor Total Homologado"
-        ].sum().reset_index()
+# =========================
+# API 3 - ATAS DE REGISTROS DE PREÇO
+# =========================
+url_atas = f"{API_BASE_URL}/modulo-arp/1_consultarARP"
+
+def parametros_atas(codigo):
+    # data de hoje
+    hoje = datetime.today().date()
+
+    # intervalo de 1 ano
+    um_ano_atras = hoje - timedelta(days=365)
+
+    # formatar para o padrão da API (YYYY-MM-DD)
+    data_min = um_ano_atras.strftime("%Y-%m-%d")
+    data_max = hoje.strftime("%Y-%m-%d")
+
+    return {
+        "pagina": 1,
+        "tamanhoPagina": 500,
+        "dataVigenciaInicialMin": data_min,
+        "dataVigenciaInicialMax": data_max,
+        "codigoUnidadeGerenciadora": codigo
+    }
+
+def carregar_atas(codigo):
+    params2 = parametros_atas(codigo)
+    registros = buscar_registros("atas", params2, codigo)
+    df_atas = normalizar_registros(
+        registros, COLUNAS_ATAS, ["Data da Assinatura", "Vigência Inicial", "Vigência Final"], ESQUEMA_ATAS
     )
-    tabela_contratos_mes.columns = ["AnoMes", "Valor Total Homologado"]
-    tabela_contratos_mes["AnoMes"] = tabela_contratos_mes["AnoMes"].dt.strftime("%b/%Y")
 
-    tabela_contratos["Data Publicação PNCP"] = tabela_contratos["Data Publicação PNCP"].dt.date
-    tabela_contratos = tabela_contratos.sort_values(
-        by="Data Publicação PNCP", ascending=False
-    ).reset_index(drop=True)
-else:
-    tabela_contratos_1 = tabela_contratos.copy()
-    tabela_contratos_mes = pd.DataFrame(columns=["AnoMes", "Valor Total Homologado"])
-    tabela_contratos["% Desconto"] = pd.Series(dtype=float)
-    tabela_contratos["% Desconto_fmt"] = pd.Series(dtype=str)
+    # garantir que a coluna esteja em datetime (sem fuso, para comparar com hoje)
+    df_atas["Vigência Final Date"] = df_atas["Vigência Final"].dt.tz_localize(None)
+    # dias restantes
+    hoje = datetime.today()
+    df_atas["Dias Restantes"] = (df_atas["Vigência Final Date"] - hoje).dt.days.astype("Int64")
+    # ordenar decrescente
+    df_atas_sorted = df_atas.sort_values(by="Vigência Final Date", ascending=True)
 
+    return df_atas, df_atas_sorted
 
 # =========================
-# API 2 - ITENS CONTRATADOS
+# GRÁFICOS A PARTIR DOS AGREGADOS
 # =========================
-url_itens = "https://dadosabertos.compras.gov.br/modulo-contratacoes/2_consultarItensContratacoes_PNCP_14133"
-params_itens = {
-    "pagina": 1,
-    "tamanhoPagina": 500,
-    "unidadeOrgaoCodigoUnidade": codigo,
-    "dataInclusaoPncpInicial": "2025-01-01",
-    "dataInclusaoPncpFinal": "2025-12-31",
-    "codigoModalidade": 6,
-}
-
-itens_list = []
-
-response2 = requests.get(url_itens, params=params_itens)
+# As figuras são montadas no servidor a partir dos rollups, uma vez por
+# snapshot: o navegador recebe no máximo TOP_CATMAT + 1 barras, uma por status
+# e uma por mês, qualquer que seja o tamanho da UASG
+TOP_CATMAT = 20
+
+def top_n_com_outros(df, categoria, valor, n):
+    # As n maiores categorias e a soma do restante em "Outros"
+    ordenado = df.sort_values(valor, ascending=False)[[categoria, valor]]
+    if len(ordenado) <= n:
+        return ordenado.reset_index(drop=True)
+    outros = pd.DataFrame({categoria: ["Outros"], valor: [ordenado[valor].iloc[n:].sum()]})
+    return pd.concat([ordenado.head(n), outros], ignore_index=True)
+
+def montar_figura_contratos_mes(tabela_contratos_mes):
+    return px.bar(tabela_contratos_mes, x="AnoMes", y="Valor Total Homologado")
+
+def montar_figura_catmat(df_catmat):
+    figura = px.bar(
+        top_n_com_outros(df_catmat, "CATMAT/CATSER", "Valor Total Final", TOP_CATMAT),
+        x="CATMAT/CATSER",
+        y="Valor Total Final",
+        title=f"{TOP_CATMAT} maiores CATMAT/CATSER por valor",
+    )
+    # Códigos são categorias, não números, mesmo quando só têm dígitos
+    figura.update_xaxes(type="category")
+    return figura
+
+def montar_figura_status(rollup_status):
+    # 🔹 Criar figure de forma segura, a partir do rollup por status
+    df_status = rollup_status.rename(columns={
+        "situacaoCompraItemNome": "Status do item", "valorTotalResultado": "Valor Total Final",
+    })
+    if not df_status.empty:
+        figure_status = px.bar(
+            df_status,
+            x="Status do item",
+            y="Valor Total Final",
+            color="Status do item",
+            title="Distribuição por Status do Item",
+        )
+    else:
+        # placeholder vazio para não quebrar o Dash
+        figure_status = px.bar(
+            pd.DataFrame({"Status do item": [], "Valor Total Final": []}),
+            x="Status do item",
+            y="Valor Total Final",
+            title="Nenhum dado disponível"
+        )
 
-if response2.status_code == 200:
-    data = response2.json()
-    resultados = data.get("resultado", [])
+    return figure_status
 
-    for contrato in resultados:
-        data_iso = contrato.get("dataInclusaoPncp", None)
+# =========================
+# ATUALIZAÇÃO PERIÓDICA DOS DADOS
+# =========================
+PARAMETROS = {
+    "contratos": parametros_contratos,
+    "itens": parametros_itens,
+    "atas": parametros_atas,
+}
+URLS = {
+    "contratos": url_contratos,
+    "itens": url_itens,
+    "atas": url_atas,
+}
 
-        if data_iso:
-            try:
-                data_obj = parser.isoparse(data_iso)
-                data_formatada = data_obj.strftime("%d/%m/%Y - %A")
-            except:
-                data_formatada = "N/A"
-        else:
-            data_formatada = "N/A"
-
-        itens_list.append(
-            {
-                "Id da Compra": contrato.get("numeroControlePNCPCompra", "N/A"),
-                "Data Publicação PNCP": data_formatada,
-                "Número do Item": contrato.get("numeroItemCompra", "N/A"),
-                "Status do item": contrato.get("situacaoCompraItemNome", "N/A"),
-                "CATMAT/CATSER": str(contrato.get("codItemCatalogo", "N/A")),
-                "Descrição Resumida": contrato.get("descricaoResumida", "N/A"),
-                "Descrição Detalhada": contrato.get("descricaodetalhada", "N/A"),
-                "Quantidade": contrato.get("quantidade", "N/A"),
-                "Valor Unitário Estimado": contrato.get("valorUnitarioEstimado", "N/A"),
-                "Valor Total Estimado": contrato.get("valorTotal", "N/A"),
-                "Valor Unitário Final": contrato.get("valorUnitarioResultado", "N/A"),
-                "Valor Total Final": contrato.get("valorTotalResultado", "N/A"),
-                "Nome do Vencedor": contrato.get("nomeFornecedor", "N/A"),
-                "CNPJ do Vencedor": contrato.get("codFornecedor", "N/A"),
-            }
+async def ingerir(codigo, revalidar=False, ao_progredir=None):
+    # Sincroniza os três endpoints ao mesmo tempo: a carga leva o tempo do
+    # endpoint mais lento, não a soma deles. `ao_progredir(endpoint, lidas, total)`
+    # recebe o andamento de cada endpoint, página a página
+    limites = {}
+
+    def progresso_de(endpoint):
+        if ao_progredir is None:
+            return None
+        return lambda lidas, total: ao_progredir(endpoint, lidas, total)
+
+    await asyncio.gather(*(
+        sincronizar(
+            endpoint, URLS[endpoint], PARAMETROS[endpoint](codigo), codigo, limites,
+            incremental=argumentos.incremental, revalidar=revalidar,
+            ao_ler_pagina=progresso_de(endpoint),
         )
+        for endpoint in SINCRONIZACAO
+    ))
+
+def versao_dos_dados(*tabelas):
+    # Hash do conteúdo: os navegadores só recebem os dados de novo quando algo mudou.
+    # Cada coluna é hasheada no próprio tipo (números, datas e categorias não
+    # viram texto); só valores não hasheáveis (listas, dicts) são convertidos
+    h = hashlib.sha1()
+    for tabela in tabelas:
+        h.update(json.dumps([list(map(str, tabela.columns)), list(map(str, tabela.dtypes))]).encode("utf-8"))
+        for coluna in tabela.columns:
+            serie = tabela[coluna]
+            try:
+                valores = pd.util.hash_pandas_object(serie, index=False)
+            except TypeError:
+                valores = pd.util.hash_pandas_object(serie.astype(str), index=False)
+            h.update(valores.values.tobytes())
+    return h.hexdigest()
 
+# =========================
+# CARGA HISTÓRICA (BACKFILL)
+# =========================
+# Percorre um intervalo de meses em janelas mensais por endpoint e UASG,
+# várias janelas ao mesmo tempo, gravando cada janela de uma vez no armazém.
+# As janelas concluídas ficam anotadas em disco: uma carga interrompida
+# continua de onde parou. O mês corrente (ou futuro) ainda pode ganhar
+# registros, então nunca é anotado e é buscado de novo a cada execução
+CHECKPOINT_BACKFILL = os.path.join(DADOS_DIR, "backfill.json")
+JANELAS_SIMULTANEAS = int(os.environ.get("COMPRASGOV_JANELAS_SIMULTANEAS", 4))
+
+def janelas_mensais(mes_inicial, mes_final):
+    # Primeiro e último dia de cada mês entre "AAAA-MM" e "AAAA-MM", inclusive
+    return [
+        (mes.start_time.strftime("%Y-%m-%d"), mes.end_time.strftime("%Y-%m-%d"))
+        for mes in pd.period_range(mes_inicial, mes_final, freq="M")
+    ]
+
+class CheckpointBackfill:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.lock = threading.Lock()
+        self.concluidas = set()
+        if os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as arquivo:
+                self.concluidas = set(json.load(arquivo))
+
+    def concluida(self, chave):
+        return chave in self.concluidas
+
+    def marcar(self, chave):
+        with self.lock:
+            self.concluidas.add(chave)
+            temporario = self.caminho + ".tmp"
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                json.dump(sorted(self.concluidas), arquivo, indent=1)
+            os.replace(temporario, self.caminho)
+
+async def executar_backfill(uasgs, mes_inicial, mes_final, endpoints=tuple(SINCRONIZACAO),
+                            janelas_simultaneas=JANELAS_SIMULTANEAS):
+    checkpoint = CheckpointBackfill(CHECKPOINT_BACKFILL)
+    hoje = datetime.today().strftime("%Y-%m-%d")
+    janelas = [
+        (endpoint, uasg, inicio, fim)
+        for uasg in uasgs
+        for endpoint in endpoints
+        for inicio, fim in janelas_mensais(mes_inicial, mes_final)
+        # Mês em aberto anotado por uma versão anterior também é buscado de novo
+        if fim >= hoje or not checkpoint.concluida(f"{endpoint}/{uasg}/{inicio[:7]}")
+    ]
+    print(f"Backfill: {len(janelas)} janelas mensais a buscar ({len(checkpoint.concluidas)} já concluídas).")
+    limites = {}
+    semaforo = asyncio.Semaphore(janelas_simultaneas)
+    resultado = {"concluidas": 0, "em_aberto": 0, "incompletas": 0, "registros": 0}
+    inicio_carga = time.monotonic()
+
+    async def processar(endpoint, uasg, inicio, fim):
+        config = SINCRONIZACAO[endpoint]
+        params = dict(PARAMETROS[endpoint](uasg))
+        params[config["param_inicial"]] = inicio
+        params[config["param_final"]] = fim
+        async with semaforo:
+            gravados = await sincronizar(endpoint, URLS[endpoint], params, uasg, limites, incremental=False)
+        if gravados is None:
+            resultado["incompletas"] += 1
+            situacao = " (incompleta, será repetida na próxima execução)"
+        elif fim >= hoje:
+            resultado["em_aberto"] += 1
+            situacao = " (mês em aberto, será buscado de novo na próxima execução)"
+        else:
+            checkpoint.marcar(f"{endpoint}/{uasg}/{inicio[:7]}")
+            resultado["concluidas"] += 1
+            situacao = ""
+        resultado["registros"] += gravados or 0
+        feitas = resultado["concluidas"] + resultado["em_aberto"] + resultado["incompletas"]
+        print(f"Backfill {feitas}/{len(janelas)}: {endpoint} da UASG {uasg} em {inicio[:7]}, "
+              f"{gravados or 0} registros{situacao}")
+
+    await asyncio.gather(*(processar(*janela) for janela in janelas))
+    resultado["segundos"] = time.monotonic() - inicio_carga
+    return resultado
+
+def consultar_agregados(endpoint, codigo):
+    data_inicial, data_final = janela_de(endpoint, PARAMETROS[endpoint](codigo))
+    return agregados.calcular(endpoint, codigo, data_inicial, data_final)
+
+def contratos_por_mes(rollup_mes):
+    # 🔹 Agregação por mês, a partir do rollup mensal (meses sem data ficam de fora)
+    df = rollup_mes.dropna(subset=["mes"]).sort_values("mes")
+    return pd.DataFrame({
+        "AnoMes": pd.to_datetime(df["mes"], format="%Y-%m").dt.strftime("%b/%Y"),
+        "Valor Total Homologado": df["valorTotalHomologado"],
+    }).reset_index(drop=True)
+
+def valor_por_catmat(rollup_catmat):
+    return rollup_catmat.rename(columns={
+        "codItemCatalogo": "CATMAT/CATSER", "valorTotalResultado": "Valor Total Final",
+    })[["CATMAT/CATSER", "Valor Total Final"]]
+
+def indicadores(rollup_mes):
+    valor_estimado_total = rollup_mes["valorTotalEstimado"].sum()
+    valor_homologado_total = rollup_mes["valorTotalHomologado"].sum()
+    economia_nominal = valor_estimado_total - valor_homologado_total
+    economia_percentual = (economia_nominal / valor_estimado_total * 100) if valor_estimado_total else 0
+    return economia_nominal, economia_percentual
 
-tabela_itens = pd.DataFrame(itens_list)
+# =========================
+# RELAÇÕES ENTRE COMPRAS, ITENS E ATAS
+# =========================
+# As três tabelas se ligam pelo número de controle PNCP da compra. Os índices
+# (chave -> posições das linhas) são montados uma vez por snapshot: o
+# detalhamento de uma compra é uma consulta ao dicionário, sem merge nem varredura
+def indexar_por(df, coluna):
+    return df.groupby(coluna, observed=True, sort=False).indices
+
+def resumir_por_compra(tabela_contratos, tabela_itens, df_atas):
+    # Itens, total homologado, fornecedores e atas de cada compra, calculados de
+    # uma vez e gravados como colunas da tabela de contratos
+    itens = tabela_itens.groupby("Id da Compra", observed=True)
+    atas = df_atas.groupby("Número de Controle PNCP")
+    compra = tabela_contratos["Número de Controle PNCP"]
+    tabela_contratos["Itens"] = compra.map(itens.size()).fillna(0).astype("Int64")
+    tabela_contratos["Total Homologado dos Itens"] = compra.map(itens["Valor Total Final"].sum()).astype("float64")
+    tabela_contratos["Fornecedores"] = compra.map(itens["CNPJ do Vencedor"].nunique()).fillna(0).astype("Int64")
+    tabela_contratos["Atas"] = compra.map(atas.size()).fillna(0).astype("Int64")
+    return tabela_contratos
 
-if not tabela_itens.empty:
-    df_catmat = tabela_itens.groupby(["CATMAT/CATSER"])["Valor Total Final"].sum().reset_index()
-else:
-    # Cria dataframe vazio com as colunas esperadas
-    df_catmat = pd.DataFrame(columns=["CATMAT/CATSER", "Valor Total Final"])
+# =========================
+# REFERÊNCIA DE PREÇOS POR CATMAT
+# =========================
+# Quantis do preço unitário final e estimado por CATMAT/CATSER e mês, sobre o
+# histórico inteiro do armazém (todas as UASGs). Saem dos histogramas dos
+# rollups de itens: os parciais de cada partição já estão materializados, então
+# recalcular é somar os histogramas e ler os quantis, sem reler itens
+QUANTIS_PRECOS = {"P10": 0.10, "P25": 0.25, "Mediana": 0.50, "P75": 0.75, "P90": 0.90}
+MIN_REGISTROS_REFERENCIA = 5  # abaixo disso o CATMAT não tem faixa de referência
+MARGEM_MINIMA_FAIXA = 0.10    # a faixa normal vai ao menos 10% além dos quartis
+
+def quantis_do_histograma(histograma, agrupar, coluna_faixa, quantis=QUANTIS_PRECOS):
+    # Para cada grupo, o quantil q é a primeira faixa em que a contagem acumulada
+    # alcança q do total do grupo. Devolve as faixas; preco_da_faixa dá o preço
+    df = histograma.dropna(subset=agrupar + [coluna_faixa])
+    df = df.groupby(agrupar + [coluna_faixa])["registros"].sum().reset_index()
+    grupos = df.groupby(agrupar, sort=False)["registros"]
+    acumulado = grupos.cumsum()
+    total = grupos.transform("sum")
+    resultado = pd.DataFrame({"Registros": grupos.sum()})
+    for nome, q in quantis.items():
+        faixa = df.loc[acumulado >= q * total].groupby(agrupar, sort=False)[coluna_faixa].first()
+        resultado[nome] = faixa.astype("float64")
+    return resultado
+
+class ReferenciaPrecos:
+    # Guarda as tabelas da última referência calculada e só recalcula quando
+    # alguma partição de itens do armazém muda (ou aparece)
+    def __init__(self, armazem, agregados):
+        self.armazem = armazem
+        self.agregados = agregados
+        self.lock = threading.Lock()
+        self.assinatura = None
+        self.tabelas = None
+
+    def calcular(self):
+        caminhos = [
+            caminho for uasg in self.armazem.uasgs("itens") for caminho in self.armazem.particoes("itens", uasg)
+        ]
+        assinatura = tuple((c, os.stat(c).st_mtime_ns, os.stat(c).st_size) for c in caminhos)
+        with self.lock:
+            if assinatura != self.assinatura:
+                parciais = [self.agregados.parcial("itens", caminho) for caminho in caminhos]
+                self.tabelas = self.montar(parciais)
+                self.assinatura = assinatura
+            return self.tabelas
+
+    def montar(self, parciais):
+        final = somar_grupos([p["preco_final"] for p in parciais], *ROLLUPS["itens"]["preco_final"])
+        estimado = somar_grupos([p["preco_estimado"] for p in parciais], *ROLLUPS["itens"]["preco_estimado"])
+
+        tabelas = {}
+        for nome, agrupar in (("mes", ["codItemCatalogo", "mes"]), ("catmat", ["codItemCatalogo"])):
+            tabela = quantis_do_histograma(final, agrupar, "faixaPrecoFinal")
+            tabela["Mediana Estimada"] = quantis_do_histograma(
+                estimado, agrupar, "faixaPrecoEstimado", {"Mediana": 0.5}
+            )["Mediana"]
+            tabelas[nome] = tabela
+
+        # Faixa de preços normais de todo o histórico: critério de Tukey em escala
+        # log (1,5 intervalo interquartil além dos quartis), medido nas bordas
+        # das faixas do histograma para não depender do erro do preço representativo
+        catmat = tabelas["catmat"]
+        log_gama = np.log(GAMA_PRECOS)
+        borda_p25, borda_p75 = (catmat["P25"] - 1) * log_gama, catmat["P75"] * log_gama
+        margem = np.maximum(1.5 * (borda_p75 - borda_p25), np.log1p(MARGEM_MINIMA_FAIXA))
+        suficiente = catmat["Registros"] >= MIN_REGISTROS_REFERENCIA
+        limite_inferior = np.exp(borda_p25 - margem).where(suficiente)
+        limite_superior = np.exp(borda_p75 + margem).where(suficiente)
+
+        for tabela in tabelas.values():
+            for coluna in [*QUANTIS_PRECOS, "Mediana Estimada"]:
+                tabela[coluna] = preco_da_faixa(tabela[coluna])
+        catmat["Final/Estimado (%)"] = (catmat["Mediana"] / catmat["Mediana Estimada"] * 100).round(1)
+        catmat["Limite Inferior"] = limite_inferior
+        catmat["Limite Superior"] = limite_superior
+        tabelas["mes"] = tabelas["mes"].reset_index().sort_values(["codItemCatalogo", "mes"]).set_index("codItemCatalogo")
+        return tabelas
+
+referencia_precos = ReferenciaPrecos(armazem, agregados)
+
+def sinalizar_precos(tabela_itens, referencia_catmat):
+    # Situação do preço final de cada item frente à faixa do seu CATMAT
+    codigos = tabela_itens["CATMAT/CATSER"]
+    # astype: sobre categorias em texto pyarrow, o map pode devolver double[pyarrow]
+    inferior = codigos.map(referencia_catmat["Limite Inferior"]).astype("float64")
+    superior = codigos.map(referencia_catmat["Limite Superior"]).astype("float64")
+    preco = tabela_itens["Valor Unitário Final"]
+    situacao = np.select(
+        [preco < inferior, preco > superior, preco.notna() & inferior.notna()],
+        ["Abaixo da faixa", "Acima da faixa", "Na faixa"],
+        default=None,
+    )
+    return pd.Series(situacao, index=tabela_itens.index).astype("category")
+
+def resumo_precos_da_uasg(tabela_itens, referencia_catmat):
+    # Referência dos CATMATs comprados pela UASG, com quantos itens dela ficaram fora da faixa
+    itens = tabela_itens.dropna(subset=["CATMAT/CATSER"])
+    grupos = itens.groupby("CATMAT/CATSER", observed=True)
+    resumo = pd.DataFrame({
+        "Descrição": grupos["Descrição Resumida"].first(),
+        "Itens da UASG": grupos.size(),
+        "Itens fora da faixa": grupos["Preço vs. referência"].agg(
+            lambda s: s.isin(["Abaixo da faixa", "Acima da faixa"]).sum()
+        ),
+    })
+    resumo = resumo.join(referencia_catmat.rename(columns={"Registros": "Registros no histórico"}))
+    resumo.index = resumo.index.astype(str)
+    resumo = resumo.rename_axis("CATMAT/CATSER").reset_index().sort_values("Itens da UASG", ascending=False)
+    return resumo.reset_index(drop=True).round(2)
+
+def montar_figura_precos(referencia_mes, catmat):
+    serie = referencia_mes.loc[[catmat]] if catmat in referencia_mes.index else referencia_mes.iloc[0:0]
+    return px.line(
+        serie,
+        x="mes",
+        y=["P25", "Mediana", "P75", "Mediana Estimada"],
+        markers=True,
+        labels={"mes": "Mês", "value": "Preço unitário (R$)", "variable": ""},
+        title=f"Preço unitário do CATMAT/CATSER {catmat} em todas as UASGs do armazém",
+    )
 
-# Indicadores principais
-valor_estimado_total = tabela_contratos["Valor Total Estimado"].sum()
-valor_homologado_total = tabela_contratos["Valor Total Homologado"].sum()
-economia_nominal = valor_estimado_total - valor_homologado_total
-economia_percentual = (economia_nominal / valor_estimado_total * 100) if valor_estimado_total else 0
+def carregar_snapshot(codigo, revalidar=False, ao_progredir=None):
+    asyncio.run(ingerir(codigo, revalidar, ao_progredir))
+    tabela_contratos = carregar_contratos(codigo)
+    tabela_itens = carregar_itens(codigo)
+    df_atas, df_atas_sorted = carregar_atas(codigo)
+    lista_atas = montar_lista_atas(df_atas_sorted)
+
+    # Indicadores e gráficos saem dos rollups materializados: só os meses
+    # regravados pela sincronização são agregados de novo
+    rollups = {endpoint: consultar_agregados(endpoint, codigo) for endpoint in ROLLUPS}
+    economia_nominal, economia_percentual = indicadores(rollups["contratos"]["mes"])
+    tabela_contratos_mes = contratos_por_mes(rollups["contratos"]["mes"])
+    df_catmat = valor_por_catmat(rollups["itens"]["catmat"])
+
+    # Referência de preços do histórico inteiro: cada item ganha a situação do
+    # seu preço frente à faixa do CATMAT
+    try:
+        referencia = referencia_precos.calcular()
+    except Exception as erro:
+        # Sem referência o painel ainda mostra contratos, itens e atas
+        print(f"Falha ao calcular a referência de preços: {erro}")
+        referencia = referencia_precos.montar([])
+    tabela_itens["Preço vs. referência"] = sinalizar_precos(tabela_itens, referencia["catmat"])
+    tabela_contratos = resumir_por_compra(tabela_contratos, tabela_itens, df_atas)
+
+    snapshot = {
+        "versao": versao_dos_dados(tabela_contratos, tabela_itens, df_atas),
+        "atualizado_em": datetime.now(),
+        "tabela_contratos": tabela_contratos,
+        "agregados": rollups,
+        "tabela_contratos_mes": tabela_contratos_mes,
+        "tabela_itens": tabela_itens,
+        "itens_por_compra": indexar_por(tabela_itens, "Id da Compra"),
+        "df_catmat": df_catmat,
+        "referencia_catmat": resumo_precos_da_uasg(tabela_itens, referencia["catmat"]),
+        "df_atas": df_atas,
+        "atas_por_compra": indexar_por(df_atas, "Número de Controle PNCP"),
+        "df_atas_sorted": df_atas_sorted,
+        "lista_atas": lista_atas,
+        "economia_nominal": economia_nominal,
+        "economia_percentual": economia_percentual,
+        "figure_status": montar_figura_status(rollups["itens"]["status"]),
+        "figure_contratos_mes": montar_figura_contratos_mes(tabela_contratos_mes),
+        "figure_catmat": montar_figura_catmat(df_catmat),
+    }
+    memoria = relatorio_memoria(snapshot)
+    print(f"Memória da UASG {codigo}: {memoria['MB'].sum():.1f} MB ("
+          + ", ".join(f"{t} {mb:.1f}" for t, mb in zip(memoria["Tabela"], memoria["MB"])) + ")")
+    return snapshot
 
 # =========================
-# API 3 - ATAS DE REGISTROS DE PREÇO
+# CACHE COMPARTILHADO ENTRE PROCESSOS
 # =========================
+# Onde os snapshots das UASGs são publicados para todos os processos do
+# servidor, e as travas que garantem que só um deles carrega cada UASG por vez.
+# "memoria" serve para um processo só; com vários workers use "arquivos" (mesma
+# máquina) ou uma URL redis:// (Redis ou compatível)
+TTL_TRAVA = 10 * 60  # segundos; uma trava de processo que morreu expira sozinha
+
+class BackendMemoria:
+    def __init__(self, max_itens=100):
+        self.max_itens = max_itens
+        self.itens = OrderedDict()
+        self.travas = {}
+        self.lock = threading.Lock()
+
+    def ler(self, chave):
+        with self.lock:
+            if chave not in self.itens:
+                return None
+            self.itens.move_to_end(chave)
+            return self.itens[chave]
+
+    def gravar(self, chave, valor):
+        with self.lock:
+            self.itens[chave] = valor
+            self.itens.move_to_end(chave)
+            while len(self.itens) > self.max_itens:
+                self.itens.popitem(last=False)
+
+    @contextmanager
+    def trava(self, chave, espera=TTL_TRAVA):
+        with self.lock:
+            trava = self.travas.setdefault(chave, threading.Lock())
+        obtida = trava.acquire(timeout=espera)
+        try:
+            yield obtida
+        finally:
+            if obtida:
+                trava.release()
 
-# data de hoje
-hoje = datetime.today().date()
+class BackendArquivos:
+    # Um arquivo pickle por chave e travas como arquivos criados com O_EXCL
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        os.makedirs(os.path.join(diretorio, "travas"), exist_ok=True)
 
-# intervalo de 1 ano
-um_ano_atras = hoje - timedelta(days=365)
+    def caminho(self, chave, pasta=""):
+        return os.path.join(self.diretorio, pasta, hashlib.sha1(chave.encode("utf-8")).hexdigest())
 
-# formatar para o padrão da API (YYYY-MM-DD)
-data_min = um_ano_atras.strftime("%Y-%m-%d")
-data_max = hoje.strftime("%Y-%m-%d")
+    def ler(self, chave):
+        try:
+            with open(self.caminho(chave), "rb") as arquivo:
+                return pickle.load(arquivo)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def gravar(self, chave, valor):
+        caminho = self.caminho(chave)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "wb") as arquivo:
+            pickle.dump(valor, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho)
+
+    @contextmanager
+    def trava(self, chave, espera=TTL_TRAVA):
+        caminho = self.caminho(chave, "travas")
+        limite = time.monotonic() + espera
+        obtida = False
+        while True:
+            try:
+                os.close(os.open(caminho, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                obtida = True
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(caminho) > TTL_TRAVA:
+                        os.remove(caminho)  # trava abandonada
+                        continue
+                except OSError:
+                    continue
+            if time.monotonic() >= limite:
+                break
+            time.sleep(0.2)
+        try:
+            yield obtida
+        finally:
+            if obtida:
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    pass
+
+class BackendRedis:
+    # Valores em pickle e travas do redis-py (SET NX com expiração e token)
+    def __init__(self, cliente_redis, prefixo="comprasgov:"):
+        self.cliente = cliente_redis
+        self.prefixo = prefixo
+
+    def ler(self, chave):
+        valor = self.cliente.get(self.prefixo + chave)
+        return None if valor is None else pickle.loads(valor)
+
+    def gravar(self, chave, valor):
+        self.cliente.set(self.prefixo + chave, pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @contextmanager
+    def trava(self, chave, espera=TTL_TRAVA):
+        trava = self.cliente.lock(self.prefixo + "trava:" + chave, timeout=TTL_TRAVA, blocking_timeout=espera)
+        obtida = trava.acquire()
+        try:
+            yield obtida
+        finally:
+            if obtida:
+                try:
+                    trava.release()
+                except redis.exceptions.LockError:
+                    pass  # expirou durante a carga
+
+def criar_backend_cache(especificacao, max_itens=100):
+    if especificacao == "memoria":
+        return BackendMemoria(max_itens)
+    if especificacao == "arquivos":
+        return BackendArquivos(os.path.join(DADOS_DIR, "compartilhado"))
+    if especificacao.startswith(("redis://", "rediss://", "unix://")):
+        if redis is None:
+            raise SystemExit("O cache compartilhado em Redis requer o pacote redis (pip install redis).")
+        return BackendRedis(redis.Redis.from_url(especificacao))
+    raise SystemExit(f"Cache compartilhado desconhecido: {especificacao!r} (use memoria, arquivos ou redis://...)")
+
+MAX_CARGAS_SIMULTANEAS = 4
+ESPERA_APOS_FALHA = 60  # segundos até uma carga que falhou ser tentada de novo
+
+class AtualizadorDados(threading.Thread):
+    # Snapshots por UASG, carregados sob demanda em segundo plano, mantidos em
+    # memória com descarte LRU e recarregados a cada `intervalo` segundos.
+    # Cada snapshot é sempre substituído por inteiro (troca de referência), então
+    # os callbacks nunca enxergam uma atualização pela metade. Os snapshots são
+    # publicados no `backend` compartilhado: com vários processos, só o que obtém
+    # a trava da UASG consulta as APIs e os demais reaproveitam o resultado.
+    # `ao_descartar` é chamado quando um snapshot é trocado por outra versão ou
+    # sai da memória, para soltar o que foi memorizado a partir dele
+    def __init__(self, intervalo, max_uasgs, backend, ao_descartar=None):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.max_uasgs = max_uasgs
+        self.backend = backend
+        self.ao_descartar = ao_descartar
+        self.snapshots = OrderedDict()
+        self.carregando = set()
+        self.falhas = {}
+        self.progresso = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=MAX_CARGAS_SIMULTANEAS)
+        self.parar = threading.Event()
+
+    def obter(self, codigo):
+        # Devolve o snapshot da UASG ou None, agendando a carga se ainda não existe
+        with self.lock:
+            snapshot = self.snapshots.get(codigo)
+            if snapshot is not None:
+                self.snapshots.move_to_end(codigo)
+                return snapshot
+            # Sem isso o intervalo da página reagendaria uma carga completa a cada tique
+            if time.monotonic() - self.falhas.get(codigo, -ESPERA_APOS_FALHA) < ESPERA_APOS_FALHA:
+                return None
+            if codigo not in self.carregando:
+                self.carregando.add(codigo)
+                self.executor.submit(self.atualizar, codigo)
+        return None
+
+    def descrever_progresso(self, codigo):
+        # Páginas lidas por endpoint na carga em andamento, para as telas de espera
+        with self.lock:
+            progresso = dict(self.progresso.get(codigo, {}))
+        return " · ".join(
+            f"{endpoint} {lidas}/{total} páginas" for endpoint, (lidas, total) in progresso.items()
+        )
 
-url_atas = "https://dadosabertos.compras.gov.br/modulo-arp/1_consultarARP"
+    def atualizar(self, codigo, revalidar=False):
+        def ao_progredir(endpoint, lidas, total):
+            with self.lock:
+                self.progresso.setdefault(codigo, {})[endpoint] = (lidas, total)
 
-params2 = {
-    "pagina": 1,
-    "tamanhoPagina": 500,
-    "dataVigenciaInicialMin": data_min,
-    "dataVigenciaInicialMax": data_max,
-    "codigoUnidadeGerenciadora": codigo
-}
-response2 = requests.get(url_atas, params=params2)
-dados2 = response2.json()
-resultados = dados2.get("resultado", [])
+        snapshot = None
+        try:
+            with self.backend.trava(f"uasg:{codigo}") as obtida:
+                # Com a trava (ou depois de esperar por ela) o snapshot publicado
+                # por outro processo vale se ainda é recente
+                snapshot = self.publicado(codigo, revalidar)
+                if snapshot is None and obtida:
+                    snapshot = carregar_snapshot(codigo, revalidar, ao_progredir)
+                    self.backend.gravar(f"versao:{codigo}", (snapshot["versao"], snapshot["atualizado_em"]))
+                    self.backend.gravar(f"snapshot:{codigo}", snapshot)
+        except Exception as erro:
+            print(f"Falha ao atualizar os dados da UASG {codigo}: {erro}")
+        with self.lock:
+            self.carregando.discard(codigo)
+            if snapshot is None:
+                self.falhas[codigo] = time.monotonic()
+            else:
+                self.falhas.pop(codigo, None)
+            self.progresso.pop(codigo, None)
+            # Uma recarga periódica não traz de volta uma UASG já descartada
+            if snapshot is None or (revalidar and codigo not in self.snapshots):
+                return
+            anterior = self.snapshots.get(codigo)
+            descartou = anterior is not None and anterior["versao"] != snapshot["versao"]
+            self.snapshots[codigo] = snapshot
+            self.snapshots.move_to_end(codigo)
+            while len(self.snapshots) > self.max_uasgs:
+                self.snapshots.popitem(last=False)
+                descartou = True
+        if descartou and self.ao_descartar is not None:
+            self.ao_descartar()
+
+    def publicado(self, codigo, revalidar=False):
+        # Snapshot publicado no backend, ou None se não há ou se a recarga pedida
+        # ainda não foi feita por ninguém (publicado há mais de meio intervalo)
+        versao = self.backend.ler(f"versao:{codigo}")
+        if versao is None:
+            return None
+        versao_publicada, atualizado_em = versao
+        if revalidar and datetime.now() - atualizado_em >= timedelta(seconds=self.intervalo / 2):
+            return None
+        with self.lock:
+            local = self.snapshots.get(codigo)
+        if local is not None and local["versao"] == versao_publicada:
+            # Mesmo conteúdo: evita desserializar o snapshot de novo
+            return {**local, "atualizado_em": atualizado_em}
+        return self.backend.ler(f"snapshot:{codigo}")
+
+    def run(self):
+        while not self.parar.wait(self.intervalo):
+            with self.lock:
+                codigos = list(self.snapshots)
+            for codigo in codigos:
+                self.atualizar(codigo, revalidar=True)
 
-atas_list = []
+# =========================
+# ALERTAS DE VIGÊNCIA DAS ATAS
+# =========================
+LIMIARES_ALERTA = (180, 90, 30)  # dias restantes que disparam um alerta
+ESTADO_ALERTAS = os.path.join(DADOS_DIR, "alertas.json")
+SMTP_HOST = os.environ.get("COMPRASGOV_SMTP_HOST", "localhost")
+SMTP_PORTA = int(os.environ.get("COMPRASGOV_SMTP_PORTA", 25))
+SMTP_REMETENTE = os.environ.get("COMPRASGOV_SMTP_REMETENTE", "dashboard-comprasgov@localhost")
+
+class IndiceVigencias:
+    # Atas de cada UASG ordenadas pela vigência final, lidas do armazém colunar e
+    # refeitas só quando alguma partição de atas da UASG muda. Achar as atas que
+    # cruzaram um limiar é uma busca binária por intervalo de datas, não uma
+    # varredura de todas as atas
+    def __init__(self, armazem):
+        self.armazem = armazem
+        self.indices = {}
+        self.lock = threading.Lock()
+
+    def obter(self, uasg):
+        caminhos = self.armazem.particoes("atas", uasg)
+        assinatura = tuple((caminho, os.stat(caminho).st_mtime_ns) for caminho in caminhos)
+        with self.lock:
+            guardado = self.indices.get(uasg)
+        if guardado is not None and guardado[0] == assinatura:
+            return guardado[1]
+
+        colunas = ["numeroControlePncpAta", "numeroAtaRegistroPreco", "objeto", "dataVigenciaFinal"]
+        df = self.armazem.ler("atas", uasg, colunas).reindex(columns=colunas)
+        vigencias = pd.to_datetime(df["dataVigenciaFinal"], format="ISO8601", utc=True, errors="coerce").dt.tz_localize(None)
+        df = df.assign(vigencia=vigencias.astype("datetime64[ns]")).dropna(subset=["vigencia"])
+        df = df.sort_values("vigencia").reset_index(drop=True)
+        with self.lock:
+            self.indices[uasg] = (assinatura, df)
+        return df
+
+    def entre(self, uasg, inicio, fim):
+        # Atas com vigência final em (inicio, fim]
+        df = self.obter(uasg)
+        vigencias = df["vigencia"].values
+        primeira = np.searchsorted(vigencias, np.datetime64(inicio, "ns"), side="right")
+        ultima = np.searchsorted(vigencias, np.datetime64(fim, "ns"), side="right")
+        return df.iloc[primeira:ultima]
+
+def detectar_alertas(indice, uasg, avisados, agora, limiares=LIMIARES_ALERTA):
+    # Atas vigentes dentro de algum limiar cujo menor limiar alcançado ainda não
+    # foi avisado. `avisados` é {controle PNCP da ata: menor limiar já avisado}:
+    # uma ata que chega ao armazém já perto do fim também gera o seu aviso
+    eventos = {}
+    for limiar in sorted(limiares, reverse=True):
+        for ata in indice.entre(uasg, agora, agora + timedelta(days=limiar)).to_dict("records"):
+            if limiar >= avisados.get(ata["numeroControlePncpAta"], math.inf):
+                continue
+            eventos[ata["numeroControlePncpAta"]] = {
+                "uasg": uasg,
+                "ata": ata["numeroAtaRegistroPreco"],
+                "controle_pncp": ata["numeroControlePncpAta"],
+                "objeto": ata["objeto"],
+                "vigencia_final": ata["vigencia"].strftime("%Y-%m-%d"),
+                "dias_restantes": (ata["vigencia"] - agora).days,
+                "limiar": limiar,
+            }
+    return list(eventos.values())
 
-def formatar_data(data_str):
-    if data_str:
-        try:
-            data_obj = parser.isoparse(data_str)
-            return data_obj.strftime("%d/%m/%Y")
-        except Exception:
-            return "N/A"
-    return "N/A"
-
-for ata in resultados:
-    atas_list.append({"Número da Ata": ata.get("numeroAtaRegistroPreco", "N/A"),
-                      "Unidade Gerenciadora": ata.get("codigoUnidadeGerenciadora", "N/A"),
-                      "Número de Compra": ata.get("numeroCompra", "N/A"),
-                      "Ano da Compra": ata.get("anoCompra", "N/A"),
-                      "Data da Assinatura": formatar_data(ata.get("dataAssinatura", "N/A")),
-                      "Vigência Inicial": formatar_data(ata.get("dataVigenciaInicial", "N/A")),
-                      "Vigência Final": formatar_data(ata.get("dataVigenciaFinal", "N/A")),
-                      "Valor Total": ata.get("valorTotal", "N/A"),
-                      "Objeto": ata.get("objeto", "N/A"),
-                      "Número de Controle da Ata": ata.get("numeroControlePncpAta", "N/A"),
-                      "Número de Controle PNCP": ata.get("numeroControlePncpCompra", "N/A"),
-                      "Id da Compra": ata.get("idCompra", "N/A"),
-                      
-                      })
-
-df_atas = pd.DataFrame(atas_list)
-df_atas_exibido = df_atas
-
-if not df_atas.empty and "Vigência Final" in df_atas.columns:
-    # garantir que a coluna esteja em datetime
-    df_atas["Vigência Final Date"] = pd.to_datetime(
-        df_atas["Vigência Final"], format="%d/%m/%Y", errors="coerce"
-    )
-    # dias restantes
-    hoje = datetime.today()
-    df_atas["Dias Restantes"] = (df_atas["Vigência Final Date"] - hoje).dt.days
-    # ordenar decrescente
-    df_atas_sorted = df_atas.sort_values(by="Vigência Final Date", ascending=True)
-else:
-    # cria um dataframe vazio com colunas esperadas (evita crash no layout)
-    df_atas = pd.DataFrame(columns=[
-        "Número da Ata","Unidade Gerenciadora","Número de Compra","Ano da Compra",
-        "Data da Assinatura","Vigência Inicial","Vigência Final","Valor Total",
-        "Objeto","Número de Controle da Ata","Número de Controle PNCP","Id da Compra",
-        "Vigência Final Date","Dias Restantes"
-    ])
-    df_atas_sorted = df_atas.copy()
-
-# garantir que a coluna esteja em datetime
-df_atas["Vigência Final Date"] = pd.to_datetime(df_atas["Vigência Final"], format="%d/%m/%Y", errors="coerce")
-# dias restantes
-hoje = datetime.today()
-df_atas["Dias Restantes"] = (df_atas["Vigência Final Date"] - hoje).dt.days
-# ordenar decrescente
-df_atas_sorted = df_atas.sort_values(by="Vigência Final Date", ascending=True)
-
-# 🔹 Criar figure de forma segura
-if not tabela_itens.empty and "Status do item" in tabela_itens.columns:
-    figure_status = px.histogram(
-        tabela_itens,
-        x="Status do item",
-        y="Valor Total Final",
-        color="Status do item",
-        title="Distribuição por Status do Item",
-    )
-else:
-    # placeholder vazio para não quebrar o Dash
-    figure_status = px.histogram(
-        pd.DataFrame({"Status do item": [], "Valor Total Final": []}),
-        x="Status do item",
-        y="Valor Total Final",
-        title="Nenhum dado disponível"
+def descrever_alerta(evento):
+    return (
+        f"Ata {evento['ata']} da UASG {evento['uasg']} vence em {evento['dias_restantes']} dias "
+        f"({evento['vigencia_final']}, limiar de {evento['limiar']} dias): {evento['objeto']}"
     )
 
+# == DESTINOS DOS ALERTAS ==
+# Cada destino recebe a lista de eventos de uma avaliação em `enviar(eventos)`
+class AlertaLog:
+    def enviar(self, eventos):
+        for evento in eventos:
+            print(f"⚠️ {descrever_alerta(evento)}")
+
+class AlertaWebhook:
+    def __init__(self, url):
+        self.url = url
+
+    def enviar(self, eventos):
+        resposta = requests.post(self.url, json={"eventos": eventos}, timeout=(TIMEOUT_CONEXAO, TIMEOUT_LEITURA))
+        resposta.raise_for_status()
+
+class AlertaEmail:
+    def __init__(self, destinatarios, host=SMTP_HOST, porta=SMTP_PORTA, remetente=SMTP_REMETENTE):
+        self.destinatarios = destinatarios
+        self.host = host
+        self.porta = porta
+        self.remetente = remetente
+
+    def enviar(self, eventos):
+        mensagem = EmailMessage()
+        mensagem["Subject"] = f"{len(eventos)} ata(s) de registro de preço perto do fim da vigência"
+        mensagem["From"] = self.remetente
+        mensagem["To"] = ", ".join(self.destinatarios)
+        mensagem.set_content("\n".join(descrever_alerta(evento) for evento in eventos))
+        with smtplib.SMTP(self.host, self.porta, timeout=TIMEOUT_CONEXAO) as smtp:
+            smtp.send_message(mensagem)
+
+class AvaliadorAlertas(threading.Thread):
+    # Reavalia periodicamente as atas de todas as UASGs do armazém e envia aos
+    # destinos as que cruzaram um limiar. O menor limiar já entregue a cada destino,
+    # por ata, fica em disco, então um reinício não repete nem perde alertas e um
+    # destino que falhou recebe os mesmos eventos na próxima avaliação; com vários
+    # processos, a trava do backend faz só um deles avaliar
+    def __init__(self, intervalo, destinos, backend, limiares=LIMIARES_ALERTA):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.destinos = destinos
+        self.backend = backend
+        self.limiares = limiares
+        self.indice = IndiceVigencias(armazem)
+        self.parar = threading.Event()
+
+    def ler_estado(self):
+        # {destino: {ata: {"limiar", "vigencia_final"}}}. Os formatos antigos, com a
+        # hora da última avaliação por UASG, viram os avisos que valiam naquela hora
+        if not os.path.exists(ESTADO_ALERTAS):
+            return {}
+        with open(ESTADO_ALERTAS, encoding="utf-8") as arquivo:
+            estado = json.load(arquivo)
+        if any(isinstance(hora, str) for hora in estado.values()):
+            estado = {type(destino).__name__: estado for destino in self.destinos}
+        return {
+            nome: self.avisos_da_hora(avisos) if any(isinstance(v, str) for v in avisos.values()) else avisos
+            for nome, avisos in estado.items()
+        }
+
+    def avisos_da_hora(self, horas):
+        avisos = {}
+        for uasg, hora in horas.items():
+            for evento in detectar_alertas(self.indice, uasg, {}, datetime.fromisoformat(hora), self.limiares):
+                avisos[evento["controle_pncp"]] = {"limiar": evento["limiar"], "vigencia_final": evento["vigencia_final"]}
+        return avisos
+
+    def gravar_estado(self, estado):
+        temporario = f"{ESTADO_ALERTAS}.{os.getpid()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(estado, arquivo, indent=1)
+        os.replace(temporario, ESTADO_ALERTAS)
+
+    def avaliar(self, agora=None):
+        agora = agora or datetime.now()
+        with self.backend.trava("alertas", espera=0) as obtida:
+            if not obtida:
+                return []
+            estado = self.ler_estado()
+            uasgs = armazem.uasgs("atas")
+            enviados = {}
+            for destino in self.destinos:
+                nome = type(destino).__name__
+                # Atas já vencidas saem do estado, que não cresce sem limite
+                avisos = {
+                    ata: aviso for ata, aviso in estado.get(nome, {}).items()
+                    if aviso["vigencia_final"] >= f"{agora:%Y-%m-%d}"
+                }
+                estado[nome] = avisos
+                avisados = {ata: aviso["limiar"] for ata, aviso in avisos.items()}
+                eventos = []
+                for uasg in uasgs:
+                    eventos.extend(detectar_alertas(self.indice, uasg, avisados, agora, self.limiares))
+                if eventos:
+                    try:
+                        destino.enviar(eventos)
+                    except Exception as erro:
+                        # Sem registrar os avisos: os eventos voltam na próxima avaliação
+                        print(f"Falha ao enviar alertas por {nome}: {erro}")
+                        continue
+                for evento in eventos:
+                    avisos[evento["controle_pncp"]] = {
+                        "limiar": evento["limiar"], "vigencia_final": evento["vigencia_final"],
+                    }
+                enviados.update((evento["controle_pncp"], evento) for evento in eventos)
+            self.gravar_estado(estado)
+        return list(enviados.values())
+
+    def run(self):
+        self.avaliar()
+        while not self.parar.wait(self.intervalo):
+            self.avaliar()
+
+def destinos_de_alerta(argumentos):
+    destinos = [AlertaLog()]
+    if argumentos.alerta_webhook:
+        destinos.append(AlertaWebhook(argumentos.alerta_webhook))
+    if argumentos.alerta_email:
+        destinos.append(AlertaEmail([e.strip() for e in argumentos.alerta_email.split(",") if e.strip()]))
+    return destinos
+
+# Criados por create_app
+atualizador = None
+avaliador_alertas = None
+uasgs_disponiveis = {}
+
+def snapshot_da_uasg(codigo):
+    snapshot = atualizador.obter(codigo) if codigo in uasgs_disponiveis else None
+    if snapshot is None:
+        raise PreventUpdate
+    return snapshot
+
+def formatar_moeda(valor):
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def como_inteiro_texto(serie):
+    # Números inteiros sem o ".0" dos floats; nulos viram texto vazio
+    return pd.to_numeric(serie, errors="coerce").astype("Int64").astype("string").fillna("")
+
+def montar_lista_atas(df_atas_sorted):
+    # Prazo de vigência das atas, montado de uma vez por snapshot com operações
+    # vetorizadas; a lista é paginada no servidor e filtrada por status
+    return pd.DataFrame({
+        "Status": definir_status(df_atas_sorted["Dias Restantes"]).values,
+        "Ata": df_atas_sorted["Número da Ata"].astype("string").fillna("").values,
+        "Compra": (
+            df_atas_sorted["Número de Compra"].astype("string").fillna("")
+            + " - " + como_inteiro_texto(df_atas_sorted["Ano da Compra"])
+        ).values,
+        "Objeto": df_atas_sorted["Objeto"].astype("string").fillna("Sem descrição").values,
+        "Vigência até": df_atas_sorted["Vigência Final"].dt.strftime("%d/%m/%Y").fillna("N/A").values,
+        "Dias Restantes": df_atas_sorted["Dias Restantes"].values,
+    })
+
 # =========================
 # DASHBOARD
 # =========================
+TAMANHO_PAGINA_TABELA = 50
+
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
 
-app.layout = dbc.Container(
-    [
-        html.H1(
-            "📊 Painel de Contratações Públicas (PNCP)", className="text-center my-4"
+def montar_layout():
+    # Montado a cada acesso à página: a lista de UASGs e a UASG inicial só são
+    # conhecidas depois de create_app
+    return dbc.Container(
+        [
+            html.H1(
+                "📊 Painel de Contratações Públicas (PNCP)", className="text-center my-4"
+            ),
+            # Card da UASG
+            dbc.Card(
+                dbc.CardBody([
+                    html.H4("🏛️ Minha UASG", className="card-title"),
+                    dcc.Dropdown(
+                        id="seletor-uasg",
+                        options=[
+                            {"label": f"{c} – {n}", "value": c} for c, n in uasgs_disponiveis.items()
+                        ],
+                        value=argumentos.uasg,
+                        clearable=False,
+                        className="mb-2",
+                    ),
+                    html.H2(id="nome-uasg", className="card-text text-primary"),
+                    html.P(
+                        "Dashboard criado a partir da requisição da API de dados abertos do Sistema do Governo Federal - Comprasgov.br",
+                        className="text-muted small mt-2"
+                    ),
+                    html.P("Carregando dados...", id="ultima-atualizacao", className="text-muted small mb-0"),
+                ]),
+                className="shadow-sm border-primary border-2 mb-4"
+            ),
+            # Busca no servidor se há um snapshot novo; só recebe dados quando a versão muda
+            dcc.Interval(id="intervalo-atualizacao", interval=10 * 1000),
+            dcc.Store(id="versao-dados"),
+
+            dbc.Row([
+        dbc.Col(
+            dbc.Card(
+                dbc.CardBody([
+                    html.H4("💰 Economia Nominal", className="card-title"),
+                    html.H2(
+                        "–",
+                        id="kpi-economia-nominal",
+                        className="card-text text-success"
+                    ),
+                    html.P(
+                        """Diferença entre o valor inicialmente estimado antes da realização do pregão no Compras.gov 
+                        e o valor homologado ao final do processo. Ressalta-se que este montante refere-se exclusivamente às 
+                        compras diretas da Unidade Gerenciadora (UG) e não inclui valores provenientes de licitações""",
+                        className="text-muted small mt-2"
+                    )
+                ]),
+                className="shadow-sm border-success border-2"
+            ),
+            md=6
         ),
-        # Card da UASG
-        dbc.Card(
+        dbc.Col(
+            dbc.Card(
+                dbc.CardBody([
+                    html.H4("📉 Economia Percentual", className="card-title"),
+                    html.H2(
+                        "–",
+                        id="kpi-economia-percentual",
+                        className="card-text text-success"
+                    ),
+                    html.P(
+                        "Percentual de economia obtido em relação a diferença entre o valor Homologado e Valor Estimado.",
+                        className="text-muted small mt-2"
+                    )
+                ]),
+                className="shadow-sm border-success border-2"
+            ),
+            md=6
+        ),
+    ], className="mb-4"),
+
+            # Busca textual em contratos, itens e atas da UASG
+            dbc.Card(
+                dbc.CardBody([
+                    html.H4("🔎 Buscar", className="card-title"),
+                    dcc.Input(
+                        id="busca",
+                        type="search",
+                        debounce=0.3,
+                        placeholder="Objeto, descrição do item ou da ata (ex.: caneta esferografica)",
+                        className="form-control mb-2",
+                    ),
+                    html.P(id="contagem-busca", className="text-muted small mb-2"),
+                    dash_table.DataTable(
+                        id="resultados-busca",
+                        columns=[
+                            {"name": c, "id": c, "presentation": "markdown"} if c == "Trecho" else {"name": c, "id": c}
+                            for c in COLUNAS_RESULTADO_BUSCA
+                        ],
+                        data=[],
+                        page_size=10,
+                        style_table={"overflowX": "auto"},
+                        style_header={"fontWeight": "bold"},
+                        style_data={"textAlign": "left", "whiteSpace": "normal", "height": "auto"},
+                    ),
+                ]),
+                className="shadow-sm mb-4"
+            ),
+
+            dcc.Tabs(
+                id="abas",
+                value="contratos",
+                children=[dcc.Tab(label=rotulo, value=aba) for aba, (rotulo, _) in ABAS.items()],
+            ),
+            html.Div(id="conteudo-aba"),
+        ],
+        fluid=True)
+
+app.layout = montar_layout
+
+# ==============================
+# ABAS RENDERIZADAS SOB DEMANDA
+# ==============================
+# Só a aba visível é montada e enviada ao navegador. O conteúdo de cada aba fica
+# guardado por versão do snapshot: voltar a uma aba já vista não remonta nada
+ESTILO_CARD = "mb-4 shadow-sm border rounded p-2"
+
+def montar_botoes_download(codigo, tabela, cor):
+    return [
+        dbc.Button("⬇️ Baixar Tabela em Excel", id=f"download-btn-{tabela}", href=f"/exportar/{codigo}/{tabela}.xlsx",
+                   color=cor, className="mb-3", external_link=True),
+        dbc.Button("CSV", id=f"download-csv-{tabela}", href=f"/exportar/{codigo}/{tabela}.csv",
+                   color=cor, outline=True, className="mb-3 ms-2", external_link=True),
+        dbc.Button("Parquet", id=f"download-parquet-{tabela}", href=f"/exportar/{codigo}/{tabela}.parquet",
+                   color=cor, outline=True, className="mb-3 ms-2", external_link=True),
+    ]
+
+def montar_tabela(id_tabela, df):
+    # Só as colunas vão no layout; as linhas chegam página a página pela paginação no servidor
+    return dash_table.DataTable(
+        id=id_tabela,
+        columns=colunas_da_tabela(df),
+        page_action="custom",
+        page_current=0,
+        page_size=TAMANHO_PAGINA_TABELA,
+        sort_action="custom",
+        sort_mode="multi",
+        sort_by=[],
+        filter_action="custom",
+        filter_query="",
+        style_table={
+            "overflowX": "auto",
+            "overflowY": "auto",
+        },
+        style_header={
+            "whiteSpace": "normal",
+            "width": "auto",
+            "fontWeight": "bold",
+            "textAlign": "center",
+        },
+        style_data={
+            "textAlign": "left"
+        },
+        fixed_rows={'headers': True},  # cabeçalho fixo ao rolar
+    )
+
+# ==============================
+# ABA 1 - DISPENSAS ELETRÔNICAS
+# ==============================
+def montar_aba_contratos(codigo, snapshot):
+    return [
+        html.Br(),
+        *montar_botoes_download(codigo, "contratos", "primary"),
+        dbc.Card([
+            dbc.CardHeader("📑 Tabela de Dispensas Eletrônicas"),
+            dbc.CardBody(montar_tabela("tabela-contratos", snapshot["tabela_contratos"])),
+        ], className=ESTILO_CARD),
+        dbc.Card([
+            dbc.CardHeader("🔗 Itens e Atas da Compra Selecionada"),
             dbc.CardBody([
-                html.H4("🏛️ Minha UASG", className="card-title"),
-                html.H2(f"{codigo} – {nome}", className="card-text text-primary"),
-                html.P(
-                    "Dashboard criado a partir da requisição da API de dados abertos do Sistema do Governo Federal - Comprasgov.br",
-                    className="text-muted small mt-2"
-                )
+                html.P("Clique em uma linha da tabela de dispensas para ver os itens e as atas da compra.",
+                       id="compra-selecionada", className="text-muted small"),
+                montar_tabela_detalhe("itens-da-compra", snapshot["tabela_itens"][COLUNAS_ITENS_DA_COMPRA]),
+                html.Br(),
+                montar_tabela_detalhe("atas-da-compra", snapshot["df_atas"][COLUNAS_ATAS_DA_COMPRA]),
             ]),
-            className="shadow-sm border-primary border-2 mb-4"
-        ),
+        ], className=ESTILO_CARD),
+        dbc.Card([
+            dbc.CardHeader("💰 Valor Total Homologado por Mês"),
+            dbc.CardBody(dcc.Graph(id="grafico-contratos-mes", figure=snapshot["figure_contratos_mes"])),
+        ], className=ESTILO_CARD),
+    ]
+
+COLUNAS_ITENS_DA_COMPRA = [
+    "Número do Item", "Descrição Resumida", "CATMAT/CATSER", "Status do item", "Quantidade",
+    "Valor Unitário Final", "Valor Total Final", "Nome do Vencedor", "Preço vs. referência",
+]
+COLUNAS_ATAS_DA_COMPRA = ["Número da Ata", "Objeto", "Vigência Inicial", "Vigência Final", "Valor Total"]
+
+def montar_tabela_detalhe(id_tabela, df):
+    return dash_table.DataTable(
+        id=id_tabela,
+        columns=colunas_da_tabela(df),
+        data=[],
+        page_size=10,
+        sort_action="native",
+        style_table={"overflowX": "auto"},
+        style_header={"whiteSpace": "normal", "fontWeight": "bold", "textAlign": "center"},
+        style_data={"textAlign": "left", "whiteSpace": "normal", "height": "auto"},
+    )
+
+@app.callback(
+    Output("compra-selecionada", "children"),
+    Output("itens-da-compra", "data"),
+    Output("atas-da-compra", "data"),
+    Input("tabela-contratos", "active_cell"),
+    State("tabela-contratos", "data"),
+    State("versao-dados", "data"),
+)
+def detalhar_compra(celula, pagina, versao):
+    # A linha clicada vem da página visível; itens e atas saem dos índices do snapshot
+    if not celula or not pagina or celula["row"] >= len(pagina) or not versao or ":carregando" in versao:
+        raise PreventUpdate
+    snapshot = snapshot_da_uasg(versao.split(":", 1)[0])
+    linha = pagina[celula["row"]]
+    compra = linha.get("Número de Controle PNCP")
+    itens = snapshot["tabela_itens"].iloc[snapshot["itens_por_compra"].get(compra, [])]
+    atas = snapshot["df_atas"].iloc[snapshot["atas_por_compra"].get(compra, [])]
+    return (
+        f"Compra {linha.get('Número da Compra')} ({compra}): {len(itens)} itens, {len(atas)} atas.",
+        para_exibicao(itens[COLUNAS_ITENS_DA_COMPRA], "tabela_itens").to_dict("records"),
+        para_exibicao(atas[COLUNAS_ATAS_DA_COMPRA], "df_atas").to_dict("records"),
+    )
+
+# ==============================
+# ABA 2 - ITENS DE CONTRATAÇÕES
+# ==============================
+def montar_aba_itens(codigo, snapshot):
+    return [
+        html.Br(),
+        *montar_botoes_download(codigo, "itens", "success"),
+        dbc.Card([
+            dbc.CardHeader("📦 Tabela de Dispensas Eletrônicas por Itens"),
+            dbc.CardBody(montar_tabela("tabela-itens", snapshot["tabela_itens"])),
+        ], className=ESTILO_CARD),
+        dbc.Card([
+            dbc.CardHeader("📦 Distribuição de Itens por Status"),
+            dbc.CardBody(dcc.Graph(id="grafico-itens-status", figure=snapshot["figure_status"])),
+        ], className="mb-4 shadow-sm border-0"),
+        dbc.Card([
+            dbc.CardHeader("💹 Valor Homologado Total por CATMAT/CATSER"),
+            dbc.CardBody(dcc.Graph(id="grafico-catmat", figure=snapshot["figure_catmat"])),
+        ], className=ESTILO_CARD),
+    ]
 
-        dbc.Row([
-    dbc.Col(
-        dbc.Card(
+# ------------------------------
+# ABA 3 - ATAS DE REGISTRO DE PREÇO
+# ------------------------------
+def montar_aba_atas(codigo, snapshot):
+    return [
+        html.Br(),
+        *montar_botoes_download(codigo, "atas", "warning"),
+        dbc.Card([
+            dbc.CardHeader("🗂️ Tabela de Atas de Registro de Preço"),
+            dbc.CardBody(montar_tabela("tabela-atas", snapshot["df_atas"])),
+        ], className=ESTILO_CARD),
+        dbc.Card([
+            dbc.CardHeader("⏳ Prazo de Vigência das Atas"),
             dbc.CardBody([
-                html.H4("💰 Economia Nominal", className="card-title"),
-                html.H2(
-                    f"R$ {economia_nominal:,.2f}"
-                    .replace(",", "X").replace(".", ",").replace("X", "."),
-                    className="card-text text-success"
+                dbc.Checklist(
+                    id="filtro-vigencia",
+                    options=[{"label": f"{s} {d}", "value": s} for s, d in DESCRICAO_FAIXAS.items()],
+                    value=list(DESCRICAO_FAIXAS),
+                    inline=True,
+                    className="mb-2",
+                ),
+                dash_table.DataTable(
+                    id="lista-atas",
+                    columns=[{"name": c, "id": c} for c in snapshot["lista_atas"].columns],
+                    page_action="custom",
+                    page_current=0,
+                    page_size=TAMANHO_PAGINA_LISTA_ATAS,
+                    style_table={"maxHeight": "500px", "overflowY": "auto"},  # <<< Scroll vertical
+                    style_cell={"textAlign": "left", "whiteSpace": "normal", "height": "auto"},
+                    style_data_conditional=[
+                        {"if": {"column_id": "Dias Restantes"}, "fontWeight": "bold"},  # <<< negrito aqui
+                    ],
+                    style_as_list_view=True,
                 ),
-                html.P(
-                    """Diferença entre o valor inicialmente estimado antes da realização do pregão no Compras.gov 
-                    e o valor homologado ao final do processo. Ressalta-se que este montante refere-se exclusivamente às 
-                    compras diretas da Unidade Gerenciadora (UG) e não inclui valores provenientes de licitações""",
-                    className="text-muted small mt-2"
-                )
             ]),
-            className="shadow-sm border-success border-2"
-        ),
-        md=6
-    ),
-    dbc.Col(
-        dbc.Card(
+        ], className=ESTILO_CARD),
+    ]
+
+TAMANHO_PAGINA_LISTA_ATAS = 20
+
+@lru_cache(maxsize=32)
+def lista_atas_filtrada(codigo, versao, faixas):
+    lista_atas = snapshot_da_uasg(codigo)["lista_atas"]
+    return lista_atas.loc[lista_atas["Status"].isin(faixas)]
+
+@app.callback(
+    Output("lista-atas", "data"),
+    Output("lista-atas", "page_count"),
+    Input("lista-atas", "page_current"),
+    Input("filtro-vigencia", "value"),
+    State("versao-dados", "data"),
+)
+def paginar_lista_atas(page_current, faixas, versao):
+    if not versao or ":carregando" in versao:
+        raise PreventUpdate
+    codigo = versao.split(":", 1)[0]
+    df = lista_atas_filtrada(codigo, versao, tuple(sorted(faixas or [])))
+    page_count = max(1, math.ceil(len(df) / TAMANHO_PAGINA_LISTA_ATAS))
+    inicio = min(page_current or 0, page_count - 1) * TAMANHO_PAGINA_LISTA_ATAS
+    return df.iloc[inicio:inicio + TAMANHO_PAGINA_LISTA_ATAS].to_dict("records"), page_count
+
+# ------------------------------
+# ABA 4 - REFERÊNCIA DE PREÇOS
+# ------------------------------
+COLUNAS_ITENS_CATMAT = [
+    "Id da Compra", "Data Publicação PNCP", "Descrição Resumida", "Quantidade",
+    "Valor Unitário Estimado", "Valor Unitário Final", "Nome do Vencedor", "Preço vs. referência",
+]
+LIMITE_OPCOES_CATMAT = 20  # opções do seletor enviadas por busca digitada
+DESTAQUE_FORA_DA_FAIXA = [
+    {"if": {"filter_query": '{Preço vs. referência} = "Acima da faixa"'}, "backgroundColor": "#f8d7da"},
+    {"if": {"filter_query": '{Preço vs. referência} = "Abaixo da faixa"'}, "backgroundColor": "#fff3cd"},
+]
+
+def opcoes_de_catmat(resumo):
+    return [
+        {"label": f"{c} – {d}", "value": c}
+        for c, d in zip(resumo["CATMAT/CATSER"], resumo["Descrição"].astype("string").fillna(""))
+    ]
+
+def montar_aba_precos(codigo, snapshot):
+    resumo = snapshot["referencia_catmat"]
+    return [
+        html.Br(),
+        dbc.Card([
+            dbc.CardHeader("🏷️ Referência de Preços por CATMAT/CATSER"),
             dbc.CardBody([
-                html.H4("📉 Economia Percentual", className="card-title"),
-                html.H2(
-                    f"{economia_percentual:.2f} %",
-                    className="card-text text-success"
-                ),
                 html.P(
-                    "Percentual de economia obtido em relação a diferença entre o valor Homologado e Valor Estimado.",
-                    className="text-muted small mt-2"
-                )
+                    "Quantis do preço unitário de cada CATMAT/CATSER comprado pela UASG, sobre todo o histórico "
+                    "do armazém (todas as UASGs). Um preço fica fora da faixa quando se afasta dos quartis mais "
+                    "de 1,5 intervalo interquartil, em escala logarítmica. Clique em uma linha para detalhar.",
+                    className="text-muted small",
+                ),
+                montar_tabela("tabela-referencia-precos", resumo),
             ]),
-            className="shadow-sm border-success border-2"
-        ),
-        md=6
-    ),
-], className="mb-4"),
-
-        dcc.Tabs(
-            [
-                # ==============================
-                # ABA 1 - DISPENSAS ELETRÔNICAS
-                # ==============================
-                dcc.Tab(
-                    label="Dispensas Eletrônicas",
-                    children=[
-                        html.Br(),
-                        dbc.Button(
-                            "⬇️ Baixar Tabela em Excel",
-                            id="download-btn-contratos",
-                            color="primary",
-                            className="mb-3",
-                        ),
-                        dcc.Download(id="download-contratos"),
-
-                        dbc.Card(
-                            [
-                                dbc.CardHeader("📑 Tabela de Dispensas Eletrônicas"),
-                                dbc.CardBody(
-                                    dash_table.DataTable(
-                                        id="tabela-contratos",
-                                        columns=[{"name": i, "id": i} for i in tabela_contratos.columns],
-                                        data=tabela_contratos.to_dict("records"),
-                                        style_table={
-                                    "overflowX": "auto",
-                                    "overflowY": "auto",
-                                    },
-                                style_header={
-                                    "whiteSpace": "normal",
-                                    "width": "auto",
-                                    "fontWeight": "bold",
-                                    "textAlign": "center",
-                                    },
-                                style_data={                                    
-                                    "textAlign": "left"
-                                    },
-                                
-                                fixed_rows={'headers': True},  # cabeçalho fixo ao rolar
-                                    )
-                                ),
-                            ],
-                            className="mb-4 shadow-sm border rounded p-2",
-                        ),
-
-                        dbc.Card(
-                            [
-                                dbc.CardHeader("💰 Valor Total Homologado por Mês"),
-                                dbc.CardBody(
-                                    dcc.Graph(id="grafico-contratos-mes",  # <<< id adicionado
-                                        figure=px.bar(
-                                            tabela_contratos_mes,
-                                            x="AnoMes",
-                                            y="Valor Total Homologado",
-                                        )
-                                    )
-                                ),
-                            ],
-                            className="mb-4 shadow-sm border rounded p-2",
-                        ),
-                        
-                    ],
+        ], className=ESTILO_CARD),
+        dbc.Card([
+            dbc.CardHeader("🔍 Detalhamento do CATMAT/CATSER"),
+            dbc.CardBody([
+                # As opções chegam do servidor conforme o usuário digita (opcoes_catmat)
+                dcc.Dropdown(
+                    id="catmat-precos",
+                    options=opcoes_de_catmat(resumo.head(1)),
+                    value=resumo["CATMAT/CATSER"].iloc[0] if len(resumo) else None,
+                    clearable=False,
                 ),
-                # ==============================
-                # ABA 2 - ITENS DE CONTRATAÇÕES
-                # ==============================
-                dcc.Tab(
-                    label="Itens das Dispensas Eletrônicas",
-                    children=[
-                        html.Br(),
-                        dbc.Button(
-                            "⬇️ Baixar Tabela em Excel",
-                            id="download-btn-itens",
-                            color="success",
-                            className="mb-3",
-                        ),
-                        dcc.Download(id="download-itens"),
-
-                        dbc.Card(
-                            [
-                                dbc.CardHeader("📦 Tabela de Dispensas Eletrônicas por Itens"),
-                                dbc.CardBody(
-                                    dash_table.DataTable(
-                                        id="tabela-itens",
-                                        columns=[{"name": i, "id": i} for i in tabela_itens.columns],
-                                        data=tabela_itens.to_dict("records"),
-                                       style_table={
-                                    "overflowX": "auto",
-                                    "overflowY": "auto",
-                                    },
-                                style_header={
-                                    "whiteSpace": "normal",
-                                    "width": "auto",
-                                    "fontWeight": "bold",
-                                    "textAlign": "center",
-                                    },
-                                style_data={                                    
-                                    "textAlign": "left"
-                                    },
-                                
-                                fixed_rows={'headers': True},  # cabeçalho fixo ao rolar
-                                    )
-                                ),
-                            ],
-                           className="mb-4 shadow-sm border rounded p-2",
-                        ),
-
-                        dbc.Card(
-                            [
-                                dbc.CardHeader("📦 Distribuição de Itens por Status"),
-                                dbc.CardBody(
-                                    dcc.Graph(id="grafico-itens-status",  # <<< id adicionado
-                                        figure=figure_status
-                                    )
-                                ),
-                            ],
-                            className="mb-4 shadow-sm border-0",
-                        ),
-                        dbc.Card([
-                            dbc.CardHeader("💹 Valor Homologado Total por CATMAT/CATSER"),
-                                dbc.CardBody(
-                                    dcc.Graph(
-                                        id="grafico-catmat",
-                                        figure= px.bar(
-                                        df_catmat, x="CATMAT/CATSER", y="Valor Total Final",))
-        ),
-    ],
-    className="mb-4 shadow-sm border rounded p-2",
-),
-                    ],
+                dcc.Graph(id="grafico-precos"),
+                dash_table.DataTable(
+                    id="itens-catmat",
+                    columns=colunas_da_tabela(snapshot["tabela_itens"][COLUNAS_ITENS_CATMAT]),
+                    page_size=TAMANHO_PAGINA_LISTA_ATAS,
+                    sort_action="native",
+                    style_table={"overflowX": "auto"},
+                    style_header={"whiteSpace": "normal", "fontWeight": "bold", "textAlign": "center"},
+                    style_data={"textAlign": "left"},
+                    style_data_conditional=DESTAQUE_FORA_DA_FAIXA,
                 ),
-            
-# ------------------------------
-# ABA 3 - ATAS DE REGISTRO DE PREÇO
-# ------------------------------     
-     
-            dcc.Tab(
-                label="Atas de Registro de Preço",
-                children=[
-                    html.Br(),
-                    dbc.Button("⬇️ Baixar Tabela em Excel", id="download-btn-atas", color="warning", className="mb-3"),
-                    dcc.Download(id="download-atas"),
-
-                    dbc.Card([
-                        dbc.CardHeader("🗂️ Tabela de Atas de Registro de Preço"),
-                        dbc.CardBody(
-                            dash_table.DataTable(
-                                id="tabela-atas",
-                                columns=[{"name": i, "id": i} for i in df_atas_exibido.columns],
-                                data=df_atas_exibido.to_dict("records"),
-                                style_table={
-                                    "overflowX": "auto",
-                                    "overflowY": "auto",
-                                    },
-                                style_header={
-                                    "whiteSpace": "normal",
-                                    "width": "auto",
-                                    "fontWeight": "bold",
-                                    "textAlign": "center",
-                                    },
-                                style_data={                                    
-                                    "textAlign": "left"
-                                    },
-                                fixed_rows={'headers': True},  # cabeçalho fixo ao rolar
-                            )
-                        ),
-                    ], className="mb-4 shadow-sm border rounded p-2"),
-                    dbc.Card([
-                        dbc.CardHeader("⏳ Prazo de Vigência das Atas"),
-                        dbc.CardBody([
-                            html.Ul([
-                            html.Li([
-                    html.Span(definir_status(row['Dias Restantes']) + " "),
-                    html.Span(f"Ata {row['Número da Ata']} | "),
-                    html.Span(f"Compra {row['Número de Compra']} - {row['Ano da Compra']} | "),
-                    html.Span(f"{row.get('Objeto', 'Sem descrição')} | "),
-                    html.Span(f"Vigência até {row['Vigência Final']} ("),
-                    html.Strong(f"{row['Dias Restantes']} dias restantes"),  # <<< negrito aqui
-                    html.Span(")")
-                ])
-                for _, row in df_atas_sorted.iterrows()
-            ],
-            style={"listStyleType": "none", "paddingLeft": "0", "margin": 0}
-        )
-    ], style={"maxHeight": "500px", "overflowY": "auto"}),  # <<< Scroll vertical),
-], className="mb-4 shadow-sm border rounded p-2")],
-            )]
-        )
-    ],
-    fluid=True)
+            ]),
+        ], className=ESTILO_CARD),
+    ]
+
+@app.callback(
+    Output("catmat-precos", "value"),
+    Input("tabela-referencia-precos", "active_cell"),
+    State("tabela-referencia-precos", "data"),
+)
+def selecionar_catmat(celula, pagina):
+    # `data` é só a página visível (paginação no servidor)
+    if not celula or not pagina or celula["row"] >= len(pagina):
+        raise PreventUpdate
+    return pagina[celula["row"]]["CATMAT/CATSER"]
+
+@app.callback(
+    Output("catmat-precos", "options"),
+    Input("catmat-precos", "search_value"),
+    State("catmat-precos", "value"),
+    State("versao-dados", "data"),
+)
+def opcoes_catmat(busca, valor, versao):
+    # Até LIMITE_OPCOES_CATMAT códigos que casam com o texto digitado (código ou
+    # descrição), mais o selecionado, que precisa continuar entre as opções
+    if not versao or ":carregando" in versao:
+        raise PreventUpdate
+    resumo = snapshot_da_uasg(versao.split(":", 1)[0])["referencia_catmat"]
+    encontrados = resumo
+    if busca:
+        encontrados = resumo.loc[
+            resumo["CATMAT/CATSER"].str.contains(busca, case=False, regex=False, na=False)
+            | resumo["Descrição"].astype("string").str.contains(busca, case=False, regex=False, na=False)
+        ]
+    encontrados = encontrados.head(LIMITE_OPCOES_CATMAT)
+    if valor is not None and valor not in set(encontrados["CATMAT/CATSER"]):
+        encontrados = pd.concat([resumo.loc[resumo["CATMAT/CATSER"] == valor], encontrados])
+    return opcoes_de_catmat(encontrados)
+
+@app.callback(
+    Output("grafico-precos", "figure"),
+    Output("itens-catmat", "data"),
+    Input("catmat-precos", "value"),
+    State("versao-dados", "data"),
+)
+def detalhar_catmat(catmat, versao):
+    # Série mensal da referência (já calculada) e itens da UASG com o CATMAT
+    if not catmat or not versao or ":carregando" in versao:
+        raise PreventUpdate
+    tabela_itens = snapshot_da_uasg(versao.split(":", 1)[0])["tabela_itens"]
+    itens = tabela_itens.loc[tabela_itens["CATMAT/CATSER"] == catmat, COLUNAS_ITENS_CATMAT]
+    figura = montar_figura_precos(referencia_precos.calcular()["mes"], catmat)
+    return figura, para_exibicao(itens, "tabela_itens").to_dict("records")
+
+ABAS = {
+    "contratos": ("Dispensas Eletrônicas", montar_aba_contratos),
+    "itens": ("Itens das Dispensas Eletrônicas", montar_aba_itens),
+    "atas": ("Atas de Registro de Preço", montar_aba_atas),
+    "precos": ("Referência de Preços", montar_aba_precos),
+}
+
+@lru_cache(maxsize=32)
+def conteudo_da_aba(versao, aba):
+    codigo = versao.split(":", 1)[0]
+    return ABAS[aba][1](codigo, snapshot_da_uasg(codigo))
+
+@app.callback(
+    Output("conteudo-aba", "children"),
+    Input("abas", "value"),
+    Input("versao-dados", "data"),
+)
+def renderizar_aba(aba, versao):
+    if not versao or aba not in ABAS:
+        raise PreventUpdate
+    if ":carregando" in versao:
+        return html.P("Carregando dados da UASG...", className="text-muted mt-3")
+    return conteudo_da_aba(versao, aba)
 
 # ==============================
-# CALLBACKS PARA DOWNLOAD
+# BUSCA TEXTUAL
 # ==============================
+# A consulta vai direto ao índice FTS5; nenhuma tabela é varrida
+LIMITE_RESULTADOS_BUSCA = 50
 
-# == BOTÃO PARA DOWNLOAD DA PLANILHA DE CONTRATOS ==
 @app.callback(
-    Output("download-contratos", "data"),
-    Input("download-btn-contratos", "n_clicks"),
-    prevent_initial_call=True,
+    Output("resultados-busca", "data"),
+    Output("contagem-busca", "children"),
+    Input("busca", "value"),
+    Input("versao-dados", "data"),
 )
-def download_contratos(n_clicks):
-    buffer = io.BytesIO()
-    tabela_contratos.to_excel(buffer, index=False)
-    buffer.seek(0)
-    return dcc.send_bytes(buffer.getvalue(), f"Contratos_{codigo}_{nome}.xlsx")
+def buscar_texto(consulta, versao):
+    if not versao or not (consulta or "").strip():
+        return [], ""
+    codigo = versao.split(":", 1)[0]
+    resultado = indice_busca.buscar(codigo, consulta, LIMITE_RESULTADOS_BUSCA)
+    if resultado.empty:
+        return [], "Nenhum resultado."
+    mais = "+" if len(resultado) == LIMITE_RESULTADOS_BUSCA else ""
+    return resultado.to_dict("records"), f"{len(resultado)}{mais} resultados, dos mais relevantes aos menos."
 
-# == BOTÃO PARA DOWNLOAD DA PLANILHA DE ITENS ==
+# ==============================
+# CALLBACK DE ATUALIZAÇÃO DOS DADOS
+# ==============================
 @app.callback(
-    Output("download-itens", "data"),
-    Input("download-btn-itens", "n_clicks"),
-    prevent_initial_call=True,
+    Output("versao-dados", "data"),
+    Output("nome-uasg", "children"),
+    Output("ultima-atualizacao", "children"),
+    Output("kpi-economia-nominal", "children"),
+    Output("kpi-economia-percentual", "children"),
+    Input("intervalo-atualizacao", "n_intervals"),
+    Input("seletor-uasg", "value"),
+    State("versao-dados", "data"),
 )
-def download_itens(n_clicks):
-    buffer = io.BytesIO()
-    tabela_itens.to_excel(buffer, index=False)
-    buffer.seek(0)
-    return dcc.send_bytes(buffer.getvalue(), f"Itens_{codigo}_{nome}.xlsx")
+def atualizar_painel(n_intervals, codigo, versao_atual):
+    # Todas as saídas vêm do mesmo snapshot, trocadas de uma vez só; o conteúdo
+    # das abas acompanha a nova versão em renderizar_aba. Só UASGs do seletor:
+    # um valor forjado dispararia cargas (e chamadas às APIs) arbitrárias
+    if codigo not in uasgs_disponiveis:
+        raise PreventUpdate
+    titulo = f"{codigo} – {uasgs_disponiveis.get(codigo, '')}"
+    snapshot = atualizador.obter(codigo)
+    progresso = atualizador.descrever_progresso(codigo) if snapshot is None else ""
+    versao = f"{codigo}:{snapshot['versao'] if snapshot else 'carregando ' + progresso}"
+    if versao == versao_atual:
+        raise PreventUpdate
+
+    if snapshot is None:
+        # Não mostra os dados da UASG anterior enquanto a nova carrega
+        return versao, titulo, f"Carregando dados da UASG... {progresso}", "–", "–"
+
+    return (
+        versao,
+        titulo,
+        f"Dados atualizados em {snapshot['atualizado_em']:%d/%m/%Y %H:%M}",
+        formatar_moeda(snapshot["economia_nominal"]),
+        f"{snapshot['economia_percentual']:.2f} %",
+    )
 
-# == BOTÃO PARA DOWNLOAD DA PLANILHA DE ATAS ==
-@app.callback(
-    Output("download-atas", "data"),
-    Input("download-btn-atas", "n_clicks"),
-    prevent_initial_call=True,
+# ==============================
+# PAGINAÇÃO, ORDENAÇÃO E FILTRO NO SERVIDOR
+# ==============================
+# Cada tabela recebe só a página visível; filtro e ordenação são feitos aqui
+TABELAS_PAGINADAS = {
+    "tabela-contratos": "tabela_contratos",
+    "tabela-itens": "tabela_itens",
+    "tabela-atas": "df_atas",
+    "tabela-referencia-precos": "referencia_catmat",
+}
+
+def colunas_da_tabela(df):
+    return [
+        {"name": i, "id": i, "type": "numeric" if pd.api.types.is_numeric_dtype(df[i]) else "text"}
+        for i in df.columns
+    ]
+
+# Formato de exibição das colunas de data (as demais usam dd/mm/aaaa)
+FORMATOS_DATA = {
+    "tabela_contratos": {"Data Publicação PNCP": "%Y-%m-%d"},
+    "tabela_itens": {"Data Publicação PNCP": "%d/%m/%Y - %A"},
+    "df_atas": {"Vigência Final Date": "%Y-%m-%d"},
+}
+
+def formato_data(chave, coluna):
+    return FORMATOS_DATA.get(chave, {}).get(coluna, "%d/%m/%Y")
+
+def para_exibicao(df, chave):
+    # Formata as datas só das linhas da página enviada ao navegador
+    df = df.copy()
+    for coluna in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[coluna]):
+            df[coluna] = df[coluna].dt.strftime(formato_data(chave, coluna)).fillna("N/A")
+    return df
+
+def sem_fuso(df):
+    # O Excel não aceita datas com fuso horário
+    df = df.copy()
+    for coluna in df.columns:
+        if isinstance(df[coluna].dtype, pd.DatetimeTZDtype):
+            df[coluna] = df[coluna].dt.tz_localize(None)
+    return df
+
+OPERADORES_FILTRO = {
+    ">=": "ge", "<=": "le", "<": "lt", ">": "gt", "!=": "ne", "=": "eq",
+    "ge": "ge", "le": "le", "lt": "lt", "gt": "gt", "ne": "ne", "eq": "eq",
+    "contains": "contains", "datestartswith": "datestartswith",
+}
+# "{Coluna} operador valor": o operador vem logo depois da chave que fecha o nome
+# da coluna (com o prefixo opcional s/i de maiúsculas do Dash), nunca do meio do texto
+PADRAO_FILTRO = re.compile(
+    r"^\s*\{(?P<coluna>[^}]*)\}\s*[si]?(?P<operador>>=|<=|!=|<|>|=|ge|le|lt|gt|ne|eq|contains|datestartswith)"
+    r"(?:\s+|$|(?<=[<>=])(?=\S))(?P<valor>.*)$",
+    re.DOTALL,
 )
-def download_atas(n_clicks):
-    buffer = io.BytesIO()
-    df_atas_exibido.to_excel(buffer, index=False)
-    buffer.seek(0)
-    return dcc.send_bytes(buffer.getvalue(), f"Atas_{codigo}_{nome}.xlsx")
+
+def separar_filtro(parte):
+    # "{Coluna} s> valor" -> ("Coluna", "gt", valor, texto do valor), no formato
+    # do filter_query do Dash
+    encontrado = PADRAO_FILTRO.match(parte)
+    if encontrado is None:
+        return None, None, None, None
+    valor_parte = encontrado["valor"].strip()
+    v0 = valor_parte[:1]
+    if len(valor_parte) > 1 and v0 == valor_parte[-1] and v0 in ("'", '"', "`"):
+        valor = valor_parte = valor_parte[1:-1].replace("\\" + v0, v0)
+    else:
+        try:
+            valor = float(valor_parte)
+        except ValueError:
+            valor = valor_parte
+    return encontrado["coluna"], OPERADORES_FILTRO[encontrado["operador"]], valor, valor_parte
+
+def mascara_filtro(serie, operador, valor, texto_valor, formato="%d/%m/%Y"):
+    datas = pd.api.types.is_datetime64_any_dtype(serie)
+    if operador in ("contains", "datestartswith"):
+        # Datas casam com o texto exibido na tabela ou com o ISO (aaaa-mm-dd)
+        if datas:
+            exibido = mascara_filtro(serie.dt.strftime(formato).fillna(""), operador, valor, texto_valor)
+            return exibido | mascara_filtro(serie.dt.strftime("%Y-%m-%d").fillna(""), operador, valor, texto_valor)
+        texto = serie.astype(str)
+        if operador == "contains":
+            return texto.str.contains(texto_valor, case=False, regex=False, na=False)
+        return texto.str.startswith(texto_valor, na=False)
+    if pd.api.types.is_numeric_dtype(serie):
+        valor = pd.to_numeric(valor, errors="coerce")
+    elif datas:
+        # Compara pelo dia exibido, ignorando a hora; "dd/mm/aaaa - dia" vale só a data
+        texto_valor = texto_valor.split(" - ")[0].strip()
+        valor = pd.to_datetime(texto_valor, dayfirst="/" in texto_valor, errors="coerce")
+        if isinstance(serie.dtype, pd.DatetimeTZDtype) and not pd.isna(valor):
+            valor = valor.tz_localize("UTC") if valor.tzinfo is None else valor
+        serie, valor = serie.dt.normalize(), valor.normalize() if not pd.isna(valor) else valor
+    else:
+        # Datas e textos são comparados como texto (datas ISO ordenam certo)
+        serie, valor = serie.astype(str), texto_valor
+    return {
+        "eq": serie == valor, "ne": serie != valor,
+        "lt": serie < valor, "le": serie <= valor,
+        "gt": serie > valor, "ge": serie >= valor,
+    }[operador].fillna(False)  # inteiros anuláveis comparam nulo como <NA>
+
+def filtrar_tabela(df, filter_query, chave=None):
+    for parte in (filter_query or "").split(" && "):
+        coluna, operador, valor, texto_valor = separar_filtro(parte)
+        if coluna not in df.columns:
+            continue
+        serie = df[coluna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            # Avalia o filtro uma vez por categoria e expande pelos códigos. O
+            # código -1 (nulo) indexa a última posição, que é justamente o nulo
+            categorias = pd.Series(list(serie.cat.categories) + [None], dtype="string")
+            aceitas = mascara_filtro(categorias, operador, valor, texto_valor).to_numpy(dtype=bool)
+            df = df.loc[aceitas[serie.cat.codes.to_numpy()]]
+        else:
+            df = df.loc[mascara_filtro(serie, operador, valor, texto_valor, formato_data(chave, coluna))]
+    return df
+
+def ordenar_tabela(df, sort_by):
+    colunas = [s for s in sort_by if s["column_id"] in df.columns]
+    if not colunas:
+        return df
+    return df.sort_values(
+        [s["column_id"] for s in colunas],
+        ascending=[s["direction"] == "asc" for s in colunas],
+        kind="mergesort",
+        na_position="last",
+    )
+
+@lru_cache(maxsize=32)
+def tabela_filtrada(codigo, versao, chave, filter_query, sort_by):
+    # Memoriza o resultado filtrado/ordenado: trocar de página só fatia o DataFrame.
+    # A versão faz parte da chave, então dados novos invalidam a entrada
+    df = atualizador.obter(codigo)[chave]
+    df = filtrar_tabela(df, filter_query, chave)
+    return ordenar_tabela(df, [dict(s) for s in sort_by])
+
+def esquecer_memorizados():
+    # Os lru_cache acima guardam DataFrames dos snapshots: sem limpá-los, uma UASG
+    # descartada continuaria em memória e o --max-uasgs-memoria não valeria
+    for funcao in (lista_atas_filtrada, conteudo_da_aba, tabela_filtrada):
+        funcao.cache_clear()
+
+def registrar_paginacao(id_tabela, chave):
+    @app.callback(
+        Output(id_tabela, "data"),
+        Output(id_tabela, "page_count"),
+        Input(id_tabela, "page_current"),
+        Input(id_tabela, "page_size"),
+        Input(id_tabela, "sort_by"),
+        Input(id_tabela, "filter_query"),
+        Input("versao-dados", "data"),
+    )
+    def paginar(page_current, page_size, sort_by, filter_query, versao):
+        if not versao or ":carregando" in versao:
+            return [], 0
+        codigo = versao.split(":", 1)[0]
+        if codigo not in uasgs_disponiveis or atualizador.obter(codigo) is None:
+            raise PreventUpdate
+        ordem = tuple(tuple(sorted(s.items())) for s in sort_by or [])
+        df = tabela_filtrada(codigo, versao, chave, filter_query or "", ordem)
+
+        page_size = page_size or TAMANHO_PAGINA_TABELA
+        page_count = max(1, math.ceil(len(df) / page_size))
+        inicio = min(page_current or 0, page_count - 1) * page_size
+        pagina = para_exibicao(df.iloc[inicio:inicio + page_size], chave)
+        return pagina.to_dict("records"), page_count
+
+for id_tabela, chave in TABELAS_PAGINADAS.items():
+    registrar_paginacao(id_tabela, chave)
+
+# ==============================
+# EXPORTAÇÃO DAS TABELAS
+# ==============================
+# Os arquivos são gerados em disco com escrita em blocos (memória constante),
+# guardados por versão do snapshot e enviados em streaming por uma rota Flask.
+# Cliques repetidos sobre os mesmos dados reaproveitam o arquivo já gerado
+EXPORTACOES_DIR = os.path.join(DADOS_DIR, "exportacoes")
+TAMANHO_BLOCO_EXPORTACAO = 10_000
+TABELAS_EXPORTAVEIS = {
+    "contratos": ("tabela_contratos", "Contratos"),
+    "itens": ("tabela_itens", "Itens"),
+    "atas": ("df_atas", "Atas"),
+}
+FORMATOS_EXPORTACAO = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def blocos_de_linhas(df):
+    # Linhas em blocos, com nulos como None, sem converter a tabela inteira de uma vez
+    for inicio in range(0, len(df), TAMANHO_BLOCO_EXPORTACAO):
+        bloco = df.iloc[inicio:inicio + TAMANHO_BLOCO_EXPORTACAO].astype(object)
+        yield from bloco.where(bloco.notna(), None).itertuples(index=False, name=None)
+
+def escrever_xlsx(df, caminho):
+    if xlsxwriter is None:
+        # Sem xlsxwriter: openpyxl em modo write-only, também sem montar a planilha em memória
+        workbook = openpyxl.Workbook(write_only=True)
+        planilha = workbook.create_sheet()
+        planilha.append(list(df.columns))
+        for linha in blocos_de_linhas(sem_fuso(df)):
+            planilha.append(linha)
+        workbook.save(caminho)
+        return
+    workbook = xlsxwriter.Workbook(caminho, {
+        "constant_memory": True,  # cada linha vai para o disco assim que é escrita
+        "remove_timezone": True,
+        "default_date_format": "dd/mm/yyyy",
+    })
+    planilha = workbook.add_worksheet()
+    planilha.write_row(0, 0, list(df.columns), workbook.add_format({"bold": True}))
+    for numero, linha in enumerate(blocos_de_linhas(df), start=1):
+        planilha.write_row(numero, 0, linha)
+    workbook.close()
+
+def escrever_csv(df, caminho):
+    df.to_csv(caminho, index=False, sep=";", decimal=",", encoding="utf-8-sig",
+              chunksize=TAMANHO_BLOCO_EXPORTACAO)
+
+def escrever_parquet(df, caminho):
+    df.to_parquet(caminho, index=False)
+
+ESCRITORES_EXPORTACAO = {"xlsx": escrever_xlsx, "csv": escrever_csv, "parquet": escrever_parquet}
+
+def arquivo_exportado(codigo, tabela, formato, snapshot):
+    # Caminho do arquivo da versão atual, gerando-o uma única vez por versão, ou
+    # None se outro processo ainda o está gerando depois de esgotada a espera
+    pasta = os.path.join(EXPORTACOES_DIR, str(codigo))
+    prefixo = f"{tabela}-"
+    caminho = os.path.join(pasta, f"{prefixo}{snapshot['versao'][:16]}.{formato}")
+    # A trava do backend vale entre processos: só um deles gera cada arquivo
+    with atualizador.backend.trava(f"exportacao:{caminho}") as obtida:
+        if not obtida:
+            # O arquivo só aparece pronto (os.replace): se já existe, pode ser enviado
+            return caminho if os.path.exists(caminho) else None
+        if not os.path.exists(caminho):
+            os.makedirs(pasta, exist_ok=True)
+            temporario = f"{caminho}.{os.getpid()}.tmp"
+            ESCRITORES_EXPORTACAO[formato](snapshot[TABELAS_EXPORTAVEIS[tabela][0]], temporario)
+            os.replace(temporario, caminho)
+            # Remove as versões antigas da mesma tabela e formato
+            for arquivo in os.listdir(pasta):
+                antigo = os.path.join(pasta, arquivo)
+                if arquivo.startswith(prefixo) and arquivo.endswith(f".{formato}") and antigo != caminho:
+                    os.remove(antigo)
+    return caminho
+
+@app.server.route("/exportar/<codigo>/<tabela>.<formato>")
+def exportar_tabela(codigo, tabela, formato):
+    if codigo not in uasgs_disponiveis or tabela not in TABELAS_EXPORTAVEIS or formato not in FORMATOS_EXPORTACAO:
+        abort(404)
+    snapshot = atualizador.obter(codigo)
+    if snapshot is None:
+        abort(503, description="Os dados desta UASG ainda estão sendo carregados.")
+    caminho = arquivo_exportado(codigo, tabela, formato, snapshot)
+    if caminho is None:
+        abort(503, description="O arquivo ainda está sendo gerado; tente de novo em instantes.")
+    nome_arquivo = f"{TABELAS_EXPORTAVEIS[tabela][1]}_{codigo}_{uasgs_disponiveis.get(codigo, '')}.{formato}"
+    return send_file(caminho, mimetype=FORMATOS_EXPORTACAO[formato],
+                     as_attachment=True, download_name=nome_arquivo)
+
+# ==============================
+# CRIAÇÃO DO APP E MODOS DE EXECUÇÃO
+# ==============================
+def create_app(config=None):
+    # Prepara o painel para servir requisições: aplica a configuração (as mesmas
+    # chaves das opções de linha de comando), busca as UASGs do CNPJ e inicia o
+    # atualizador em segundo plano. Nada disso acontece ao importar o módulo, então
+    # ele pode ser carregado por servidores WSGI; cada processo chama create_app
+    global argumentos, atualizador, avaliador_alertas, uasgs_disponiveis
+    argumentos = argparse.Namespace(**{**vars(interpretar_argumentos([])), **(config or {})})
+
+    if argumentos.limpar_cache:
+        cache_respostas.limpar()
+    if argumentos.sem_cache:
+        cliente.cache = None
+
+    # Configurar idioma para português (nem todo servidor tem o locale instalado)
+    try:
+        locale.setlocale(locale.LC_TIME, "pt_BR.UTF-8")
+    except locale.Error:
+        print("Locale pt_BR.UTF-8 indisponível; os meses aparecem no idioma do sistema.")
+
+    uasgs_disponiveis = {u["codigoUasg"]: u["nomeUasg"] for u in buscar_uasgs(argumentos.cnpj)}
+    if argumentos.uasg and argumentos.uasg not in uasgs_disponiveis:
+        uasgs_disponiveis[argumentos.uasg] = ""
+    if not argumentos.uasg and uasgs_disponiveis:
+        argumentos.uasg = next(iter(uasgs_disponiveis))
+
+    if atualizador is not None:
+        atualizador.parar.set()
+    atualizador = AtualizadorDados(
+        argumentos.intervalo_atualizacao * 60,
+        argumentos.max_uasgs_memoria,
+        criar_backend_cache(argumentos.cache_compartilhado or "memoria", max_itens=2 * argumentos.max_uasgs_memoria),
+        ao_descartar=esquecer_memorizados,
+    )
+    esquecer_memorizados()
+    if argumentos.uasg:
+        atualizador.obter(argumentos.uasg)  # começa a carregar a UASG inicial
+    atualizador.start()
+
+    if avaliador_alertas is not None:
+        avaliador_alertas.parar.set()
+        avaliador_alertas = None
+    if argumentos.alertas:
+        avaliador_alertas = AvaliadorAlertas(
+            argumentos.intervalo_alertas * 60, destinos_de_alerta(argumentos), atualizador.backend,
+        )
+        avaliador_alertas.start()
+    return app
+
+def tem_interface_grafica():
+    if tk is None:
+        return False
+    return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+def cache_para_varios_processos(config):
+    # O backend em memória é de cada processo: com ele, cada worker consultaria
+    # as APIs por conta própria, sem trava nem snapshot compartilhados
+    if config.get("cache_compartilhado") == "memoria":
+        raise SystemExit("--cache-compartilhado memoria não é compartilhado entre processos; "
+                         "use arquivos ou redis://... com mais de um worker.")
+    return {**config, "cache_compartilhado": config.get("cache_compartilhado") or "arquivos"}
+
+def servir_com_gunicorn(config):
+    # Vários processos atrás do proxy reverso. Cada worker chama create_app depois
+    # do fork, com o próprio atualizador (threads não sobrevivem ao fork)
+    config = cache_para_varios_processos(config)
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("--workers maior que 1 requer o gunicorn instalado (pip install gunicorn).")
+
+    class ServidorGunicorn(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{config['host']}:{config['port']}")
+            self.cfg.set("workers", config["workers"])
+            self.cfg.set("timeout", 120)
+
+        def load(self):
+            return create_app(config).server
+
+    ServidorGunicorn().run()
+
+def main(argv=None):
+    config = vars(interpretar_argumentos(argv))
+    if config["backfill"]:
+        if config["limpar_cache"]:
+            cache_respostas.limpar()
+        if config["sem_cache"]:
+            cliente.cache = None
+        uasgs = [config["uasg"]] if config["uasg"] else [u["codigoUasg"] for u in buscar_uasgs(config["cnpj"])]
+        resultado = asyncio.run(executar_backfill(uasgs, *config["backfill"]))
+        print(f"Backfill terminado: {resultado['concluidas']} janelas concluídas, "
+              f"{resultado['em_aberto']} em aberto, {resultado['incompletas']} incompletas; "
+              f"{resultado['registros']} registros em {resultado['segundos']:.0f} s "
+              f"({resultado['registros'] / max(resultado['segundos'], 1e-9):.0f} registros/s).")
+        return
+
+    desktop = not config["sem_janela"] and tem_interface_grafica()
+
+    # =========================
+    # SELECIONAR AQUI ANTES DO DASHBOARD
+    # =========================
+    if desktop and not config["uasg"]:
+        config["uasg"], _ = selecionar_uasg(config["cnpj"])
+
+    if config["workers"] > 1:
+        servir_com_gunicorn(config)
+    elif desktop:
+        create_app(config)
+        abrir_janela(argumentos.uasg, config["port"])
+    else:
+        create_app(config)
+        iniciar_dashboard(config["host"], config["port"])
 
 # ==============================
 # RUN
 # ==============================
 if __name__ == "__main__":
-    abrir_janela()
+    main()
@@ -0,0 +1,515 @@
+# Benchmarks offline do painel, sem depender da API do governo:
+#
+#   gravar  - guarda respostas reais dos três endpoints como fixtures
+#   servir  - sobe um servidor HTTP local que reproduz as APIs a partir das
+#             fixtures, em qualquer volume, com latência e falhas configuráveis
+#   medir   - mede as etapas do painel (busca, normalização, derivação,
+#             agregação, layout, exportação...) contra esse servidor
+#
+#   python benchmark_comprasgov.py gravar --uasg 153978
+#   python benchmark_comprasgov.py servir --registros 100000 --latencia 0.05 --falhas 0.1
+#   python benchmark_comprasgov.py medir --registros 10000 100000 --saida base.json
+#   python benchmark_comprasgov.py medir --registros 10000 100000 --comparar base.json
+#
+# Com o servidor no ar, o próprio painel pode rodar contra ele:
+#   COMPRASGOV_API_URL=http://127.0.0.1:8765 python Dashboard_Dados_Abertos_Comprasgov.py --uasg 000001
+import argparse
+import asyncio
+import json
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_FIXTURES = os.path.join(DIRETORIO, "fixtures")
+
+# Caminho de cada endpoint reproduzido e parâmetros da janela de datas
+ENDPOINTS = {
+    "contratos": {
+        "caminho": "/modulo-contratacoes/1_consultarContratacoes_PNCP_14133",
+        "param_inicial": "dataPublicacaoPncpInicial",
+        "param_final": "dataPublicacaoPncpFinal",
+    },
+    "itens": {
+        "caminho": "/modulo-contratacoes/2_consultarItensContratacoes_PNCP_14133",
+        "param_inicial": "dataInclusaoPncpInicial",
+        "param_final": "dataInclusaoPncpFinal",
+    },
+    "atas": {
+        "caminho": "/modulo-arp/1_consultarARP",
+        "param_inicial": "dataVigenciaInicialMin",
+        "param_final": "dataVigenciaInicialMax",
+    },
+}
+CAMINHO_UASGS = "/modulo-uasg/1_consultarUasg"
+
+# Volume de cada endpoint em relação ao número de itens pedido: cinco itens
+# por compra e uma ata a cada duas compras
+PROPORCAO = {"contratos": 0.2, "itens": 1.0, "atas": 0.1}
+ITENS_POR_COMPRA = 5
+
+# Falhas simuladas: as requisições sorteadas recebem um destes status nas
+# primeiras FALHAS_SEGUIDAS tentativas (429 e 503 com Retry-After)
+STATUS_FALHA = (429, 500, 502, 503, 504)
+STATUS_COM_RETRY_AFTER = {429, 503}
+FALHAS_SEGUIDAS = 2
+
+# Modelos usados quando não há fixtures gravadas: um registro de cada endpoint,
+# com os campos que o painel lê
+MODELOS_PADRAO = {
+    "contratos": [{
+        "numeroControlePNCP": "00394502000144-1-000001/2025",
+        "numeroCompra": "90001",
+        "objetoCompra": "Aquisição de material de expediente para atender às necessidades da unidade",
+        "processo": "00000.000001/2025-01",
+        "unidadeOrgaoCodigoUnidade": "000001",
+        "unidadeOrgaoNomeUnidade": "UASG SINTÉTICA",
+        "dataPublicacaoPncp": "2025-01-01T10:00:00",
+        "valorTotalEstimado": 12500.0,
+        "valorTotalHomologado": 10930.5,
+        "codigoModalidade": 6,
+    }],
+    "itens": [{
+        "numeroControlePNCPCompra": "00394502000144-1-000001/2025",
+        "numeroItemCompra": 1,
+        "situacaoCompraItemNome": "Homologado",
+        "codItemCatalogo": 232870,
+        "descricaoResumida": "Caneta esferográfica",
+        "descricaodetalhada": "Caneta esferográfica, material corpo plástico, quantidade cargas 1, "
+                              "material ponta latão com esfera de tungstênio, tipo escrita média, cor tinta azul",
+        "quantidade": 100,
+        "valorUnitarioEstimado": 1.85,
+        "valorTotal": 185.0,
+        "valorUnitarioResultado": 1.49,
+        "valorTotalResultado": 149.0,
+        "nomeFornecedor": "PAPELARIA EXEMPLO LTDA",
+        "codFornecedor": "00000000000191",
+        "dataInclusaoPncp": "2025-01-01T10:00:00",
+    }],
+    "atas": [{
+        "numeroAtaRegistroPreco": "00001/2025",
+        "codigoUnidadeGerenciadora": "000001",
+        "numeroCompra": "90001",
+        "anoCompra": 2025,
+        "dataAssinatura": "2025-01-01",
+        "dataVigenciaInicial": "2025-01-01",
+        "dataVigenciaFinal": "2026-01-01",
+        "valorTotal": 48000.0,
+        "objeto": "Registro de preços para eventual aquisição de água mineral",
+        "numeroControlePncpAta": "00394502000144-1-000001/2025-000001",
+        "numeroControlePncpCompra": "00394502000144-1-000001/2025",
+        "idCompra": "00000105900012025",
+    }],
+}
+
+# =========================
+# FIXTURES
+# =========================
+def caminho_fixture(diretorio, endpoint):
+    return os.path.join(diretorio, f"{endpoint}.json")
+
+def carregar_modelos(diretorio):
+    modelos = {}
+    for endpoint in ENDPOINTS:
+        caminho = caminho_fixture(diretorio, endpoint)
+        if os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as arquivo:
+                modelos[endpoint] = json.load(arquivo) or MODELOS_PADRAO[endpoint]
+        else:
+            modelos[endpoint] = MODELOS_PADRAO[endpoint]
+    return modelos
+
+def gravar_fixtures(uasg, paginas, diretorio):
+    # Respostas reais da API (mesmos parâmetros do painel), só a lista de registros
+    painel = importar_painel()
+    painel.cliente.cache = None
+    os.makedirs(diretorio, exist_ok=True)
+    for endpoint in ENDPOINTS:
+        url, params = painel.URLS[endpoint], painel.PARAMETROS[endpoint](uasg)
+        registros = []
+        for pagina in range(1, paginas + 1):
+            data = painel.buscar_pagina(url, params, pagina)
+            if not data or not data.get("resultado"):
+                break
+            registros.extend(data["resultado"])
+        with open(caminho_fixture(diretorio, endpoint), "w", encoding="utf-8") as arquivo:
+            json.dump(registros, arquivo, ensure_ascii=False, indent=1)
+        print(f"{endpoint}: {len(registros)} registros gravados em {caminho_fixture(diretorio, endpoint)}")
+
+# =========================
+# GERADOR SINTÉTICO
+# =========================
+def data_da_janela(inicio, fim, i):
+    # Espalha os registros pelos dias da janela pedida, de forma determinística
+    dias = max((fim - inicio).days, 0)
+    return inicio + timedelta(days=(i * 7919) % (dias + 1))
+
+def sintetizar(endpoint, modelos, i, inicio, fim):
+    # Registro i do volume sintético: copia um modelo e troca as chaves (para não
+    # colidirem no armazém), a data e um pouco dos valores. Itens e atas apontam
+    # para as compras sintéticas, então as ligações entre tabelas se mantêm
+    registro = dict(modelos[i % len(modelos)])
+    dia = data_da_janela(inicio, fim, i)
+    fator = 0.8 + (i % 41) / 100
+    if endpoint == "contratos":
+        registro["numeroControlePNCP"] = f"SINT-{i:08d}"
+        registro["numeroCompra"] = str(90000 + i)
+        registro["dataPublicacaoPncp"] = f"{dia.isoformat()}T10:00:00"
+        for campo in ("valorTotalEstimado", "valorTotalHomologado"):
+            if isinstance(registro.get(campo), (int, float)):
+                registro[campo] = round(registro[campo] * fator, 2)
+    elif endpoint == "itens":
+        registro["numeroControlePNCPCompra"] = f"SINT-{i // ITENS_POR_COMPRA:08d}"
+        registro["numeroItemCompra"] = i % ITENS_POR_COMPRA + 1
+        registro["dataInclusaoPncp"] = f"{dia.isoformat()}T10:00:00"
+        if isinstance(registro.get("codItemCatalogo"), int):
+            registro["codItemCatalogo"] += i % 500
+        registro["nomeFornecedor"] = f"{registro.get('nomeFornecedor') or 'FORNECEDOR'} {i % 300}"
+        registro["codFornecedor"] = f"{i % 300:014d}"
+        for campo in ("valorUnitarioEstimado", "valorTotal", "valorUnitarioResultado", "valorTotalResultado"):
+            if isinstance(registro.get(campo), (int, float)):
+                registro[campo] = round(registro[campo] * fator, 2)
+    else:
+        registro["numeroControlePncpAta"] = f"SINT-ATA-{i:08d}"
+        registro["numeroAtaRegistroPreco"] = f"{i:05d}/{dia.year}"
+        registro["numeroControlePncpCompra"] = f"SINT-{2 * i:08d}"
+        registro["dataVigenciaInicial"] = dia.isoformat()
+        registro["dataVigenciaFinal"] = (dia + timedelta(days=365)).isoformat()
+    return registro
+
+# =========================
+# SERVIDOR DE REPRODUÇÃO
+# =========================
+def ler_data(texto, padrao):
+    try:
+        return date.fromisoformat(texto[:10])
+    except (TypeError, ValueError):
+        return padrao
+
+class ReproducaoAPI(BaseHTTPRequestHandler):
+    # Responde como as APIs de dados abertos: páginas de `tamanhoPagina`
+    # registros, com totalRegistros/totalPaginas, depois de `latencia` segundos.
+    # Uma fração `falhas` das URLs é sorteada pelo hash (sempre as mesmas, para
+    # as medições serem comparáveis) e falha nas primeiras tentativas
+    def log_message(self, *args):
+        pass
+
+    def falhar(self):
+        # True se respondeu com erro; conta as tentativas de cada URL
+        sorteio = zlib.crc32(self.path.encode("utf-8"))
+        if sorteio / 2 ** 32 >= self.server.falhas:
+            return False
+        with self.server.lock:
+            self.server.tentativas[self.path] += 1
+            if self.server.tentativas[self.path] > FALHAS_SEGUIDAS:
+                return False
+            self.server.falhas_servidas += 1
+        status = STATUS_FALHA[sorteio % len(STATUS_FALHA)]
+        self.send_response(status)
+        if status in STATUS_COM_RETRY_AFTER:
+            self.send_header("Retry-After", str(self.server.retry_after))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return True
+
+    def responder(self, corpo):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        partes = urlsplit(self.path)
+        consulta = {chave: valores[0] for chave, valores in parse_qs(partes.query).items()}
+        time.sleep(self.server.latencia)
+        if partes.path.endswith(CAMINHO_UASGS):
+            self.responder({"resultado": [{"codigoUasg": "000001", "nomeUasg": "UASG SINTÉTICA"}]})
+            return
+        endpoint = next((e for e, c in ENDPOINTS.items() if partes.path.endswith(c["caminho"])), None)
+        if endpoint is None:
+            self.send_error(404)
+            return
+        if self.falhar():
+            return
+
+        config = ENDPOINTS[endpoint]
+        inicio = ler_data(consulta.get(config["param_inicial"]), date(2025, 1, 1))
+        fim = ler_data(consulta.get(config["param_final"]), date(2025, 12, 31))
+        total = int(self.server.registros * PROPORCAO[endpoint])
+        tamanho = int(consulta.get("tamanhoPagina", 500))
+        pagina = int(consulta.get("pagina", 1))
+        paginas = max(1, math.ceil(total / tamanho))
+        modelos = self.server.modelos[endpoint]
+        self.responder({
+            "resultado": [
+                sintetizar(endpoint, modelos, i, inicio, fim)
+                for i in range((pagina - 1) * tamanho, min(pagina * tamanho, total))
+            ],
+            "totalRegistros": total,
+            "totalPaginas": paginas,
+            "paginasRestantes": max(0, paginas - pagina),
+        })
+
+def iniciar_servidor(modelos, registros, latencia=0.0, host="127.0.0.1", porta=0, falhas=0.0, retry_after=1):
+    servidor = ThreadingHTTPServer((host, porta), ReproducaoAPI)
+    servidor.daemon_threads = True
+    servidor.modelos = modelos
+    servidor.registros = registros
+    servidor.latencia = latencia
+    servidor.falhas = falhas
+    servidor.retry_after = retry_after
+    servidor.tentativas = Counter()
+    servidor.falhas_servidas = 0
+    servidor.lock = threading.Lock()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+# =========================
+# MEDIÇÃO
+# =========================
+def importar_painel():
+    # O painel lê a configuração das variáveis de ambiente ao ser importado
+    sys.path.insert(0, DIRETORIO)
+    import Dashboard_Dados_Abertos_Comprasgov as painel
+    return painel
+
+def cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos)
+
+def contar_registros(painel, uasg):
+    return {
+        endpoint: sum(len(painel.armazem.ler_particao(endpoint, c)) for c in painel.armazem.particoes(endpoint, uasg))
+        for endpoint in painel.SINCRONIZACAO
+    }
+
+def medir_volume(painel, servidor, registros, repeticoes, pasta_temporaria, falhas):
+    from plotly.utils import PlotlyJSONEncoder
+
+    servidor.registros = registros
+    resultado = {}
+
+    # Busca: cada repetição usa uma UASG nova, para medir a carga completa
+    # (páginas, gravação no armazém e índice de busca) e não um upsert
+    codigos = [f"B{registros}R{r}" for r in range(repeticoes)]
+    fila = list(codigos)
+    resultado["busca"] = cronometrar(lambda: asyncio.run(painel.ingerir(fila.pop(0))), repeticoes)
+    codigo = codigos[-1]
+
+    # Busca com falhas: o mesmo volume com parte das páginas respondendo 429/5xx.
+    # Mede o custo das repetições com backoff e confere que nada se perdeu
+    if falhas:
+        servidor.falhas = falhas
+        codigos_falha = [f"F{registros}R{r}" for r in range(repeticoes)]
+        fila = list(codigos_falha)
+        inicio_falhas = servidor.falhas_servidas
+        try:
+            resultado["busca_com_falhas"] = cronometrar(
+                lambda: asyncio.run(painel.ingerir(fila.pop(0))), repeticoes
+            )
+        finally:
+            servidor.falhas = 0.0
+        print(f"  {servidor.falhas_servidas - inicio_falhas} respostas de erro servidas")
+        esperado = contar_registros(painel, codigo)
+        for codigo_falha in codigos_falha:
+            obtido = contar_registros(painel, codigo_falha)
+            if obtido != esperado:
+                raise SystemExit(f"Busca com falhas incompleta na UASG {codigo_falha}: {obtido} != {esperado}")
+
+    brutos = {}
+
+    def ler():
+        for endpoint in painel.SINCRONIZACAO:
+            brutos[endpoint] = painel.buscar_registros(endpoint, painel.PARAMETROS[endpoint](codigo), codigo)
+    resultado["leitura"] = cronometrar(ler, repeticoes)
+
+    normalizados = {}
+
+    def normalizar():
+        normalizados["contratos"] = painel.normalizar_registros(
+            brutos["contratos"], painel.COLUNAS_CONTRATOS, ["Data Publicação PNCP"]
+        )
+        normalizados["itens"] = painel.normalizar_registros(
+            brutos["itens"], painel.COLUNAS_ITENS, ["Data Publicação PNCP"], painel.ESQUEMA_ITENS
+        )
+        normalizados["atas"] = painel.normalizar_registros(
+            brutos["atas"], painel.COLUNAS_ATAS, ["Data da Assinatura", "Vigência Inicial", "Vigência Final"],
+            painel.ESQUEMA_ATAS,
+        )
+    resultado["normalizacao"] = cronometrar(normalizar, repeticoes)
+
+    def derivar():
+        contratos = painel.derivar_contratos(normalizados["contratos"].copy())
+        painel.resumir_por_compra(contratos, normalizados["itens"], normalizados["atas"])
+        painel.indexar_por(normalizados["itens"], "Id da Compra")
+    resultado["derivacao"] = cronometrar(derivar, repeticoes)
+
+    def agregar():
+        painel.agregados.parciais.clear()
+        for endpoint in painel.ROLLUPS:
+            painel.consultar_agregados(endpoint, codigo)
+    resultado["agregacao"] = cronometrar(agregar, repeticoes)
+
+    def referencia():
+        painel.referencia_precos.assinatura = None
+        painel.referencia_precos.calcular()
+    resultado["referencia_precos"] = cronometrar(referencia, repeticoes)
+
+    # O snapshot completo é montado uma vez, fora da medição, só para as etapas
+    # que dependem dele; a ingestão incremental quase não vai à rede
+    painel.argumentos.incremental = True
+    snapshot = painel.carregar_snapshot(codigo)
+    painel.argumentos.incremental = False
+
+    def layout():
+        for _, montar in painel.ABAS.values():
+            json.dumps(montar(codigo, snapshot), cls=PlotlyJSONEncoder)
+    resultado["layout"] = cronometrar(layout, repeticoes)
+
+    caminho_xlsx = os.path.join(pasta_temporaria, "itens.xlsx")
+    resultado["exportacao_xlsx"] = cronometrar(
+        lambda: painel.escrever_xlsx(snapshot["tabela_itens"], caminho_xlsx), repeticoes
+    )
+
+    def buscar_texto():
+        for consulta in ("caneta", "agua mineral", "material expediente", "aquisicao"):
+            painel.indice_busca.buscar(codigo, consulta)
+    resultado["busca_textual"] = cronometrar(buscar_texto, repeticoes)
+    return resultado
+
+def medir(volumes, repeticoes, latencia, fixtures, falhas=0.0, retry_after=1):
+    modelos = carregar_modelos(fixtures)
+    servidor = iniciar_servidor(modelos, volumes[0], latencia, retry_after=retry_after)
+    pasta_temporaria = tempfile.mkdtemp(prefix="benchmark_comprasgov_")
+    os.environ.update({
+        "COMPRASGOV_API_URL": f"http://127.0.0.1:{servidor.server_address[1]}",
+        "COMPRASGOV_CACHE_DIR": pasta_temporaria,
+        "COMPRASGOV_DADOS_DIR": pasta_temporaria,
+        "COMPRASGOV_REQUISICOES_POR_SEGUNDO": "0",
+    })
+    try:
+        painel = importar_painel()
+        painel.cliente.cache = None  # toda busca vai ao servidor de reprodução
+        resultados = {}
+        for registros in volumes:
+            print(f"Medindo {registros} itens ({repeticoes} repetições)...")
+            resultados[str(registros)] = medir_volume(
+                painel, servidor, registros, repeticoes, pasta_temporaria, falhas
+            )
+        return resultados
+    finally:
+        servidor.shutdown()
+        shutil.rmtree(pasta_temporaria, ignore_errors=True)
+
+def imprimir(resultados, base=None):
+    for volume, etapas in resultados.items():
+        print(f"\n{volume} itens")
+        for etapa, segundos in etapas.items():
+            linha = f"  {etapa:<20}{segundos:>10.3f} s"
+            anterior = (base or {}).get(volume, {}).get(etapa)
+            if anterior:
+                linha += f"  ({(segundos / anterior - 1) * 100:+.0f}% vs. base)"
+            print(linha)
+
+def regressoes(resultados, base, tolerancia):
+    return [
+        (volume, etapa, base[volume][etapa], segundos)
+        for volume, etapas in resultados.items()
+        for etapa, segundos in etapas.items()
+        if base.get(volume, {}).get(etapa) and segundos > base[volume][etapa] * (1 + tolerancia)
+    ]
+
+# =========================
+# LINHA DE COMANDO
+# =========================
+def interpretar_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks offline do Dashboard Comprasgov")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    gravar = comandos.add_parser("gravar", help="grava respostas reais das APIs como fixtures")
+    gravar.add_argument("--uasg", required=True)
+    gravar.add_argument("--paginas", type=int, default=1, help="páginas gravadas por endpoint (padrão: 1)")
+    gravar.add_argument("--fixtures", default=DIRETORIO_FIXTURES)
+
+    servir = comandos.add_parser("servir", help="reproduz as APIs localmente a partir das fixtures")
+    servir.add_argument("--registros", type=int, default=10_000, help="itens servidos (padrão: 10000)")
+    servir.add_argument("--latencia", type=float, default=0.0, help="segundos por requisição")
+    servir.add_argument("--falhas", type=float, default=0.0,
+                        help="fração das requisições que falha com 429/5xx nas primeiras tentativas")
+    servir.add_argument("--retry-after", type=int, default=1, help="Retry-After das respostas 429/503 (segundos)")
+    servir.add_argument("--host", default="127.0.0.1")
+    servir.add_argument("--porta", type=int, default=8765)
+    servir.add_argument("--fixtures", default=DIRETORIO_FIXTURES)
+
+    medir_ = comandos.add_parser("medir", help="mede as etapas do painel contra o servidor local")
+    medir_.add_argument("--registros", type=int, nargs="+", default=[10_000, 100_000],
+                        help="volumes de itens medidos (padrão: 10000 100000)")
+    medir_.add_argument("--repeticoes", type=int, default=3)
+    medir_.add_argument("--latencia", type=float, default=0.0, help="segundos por requisição")
+    medir_.add_argument("--falhas", type=float, default=0.05,
+                        help="fração de requisições com falha na etapa busca_com_falhas (padrão: 0.05; 0 desliga)")
+    medir_.add_argument("--retry-after", type=int, default=1, help="Retry-After das respostas 429/503 (segundos)")
+    medir_.add_argument("--fixtures", default=DIRETORIO_FIXTURES)
+    medir_.add_argument("--saida", help="grava os resultados (JSON) para comparações futuras")
+    medir_.add_argument("--comparar", help="resultados de referência (JSON) gravados com --saida")
+    medir_.add_argument("--tolerancia", type=float, default=0.2,
+                        help="aumento relativo aceito antes de acusar regressão (padrão: 0.2)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    argumentos = interpretar_argumentos(argv)
+    if argumentos.comando == "gravar":
+        gravar_fixtures(argumentos.uasg, argumentos.paginas, argumentos.fixtures)
+        return 0
+
+    if argumentos.comando == "servir":
+        servidor = iniciar_servidor(
+            carregar_modelos(argumentos.fixtures), argumentos.registros, argumentos.latencia,
+            argumentos.host, argumentos.porta, argumentos.falhas, argumentos.retry_after,
+        )
+        print(f"Reproduzindo as APIs em http://{argumentos.host}:{servidor.server_address[1]} "
+              f"({argumentos.registros} itens, latência de {argumentos.latencia} s, "
+              f"{argumentos.falhas:.0%} de falhas). Ctrl+C para sair.")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            servidor.shutdown()
+        return 0
+
+    base = None
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+    resultados = medir(
+        argumentos.registros, argumentos.repeticoes, argumentos.latencia, argumentos.fixtures,
+        argumentos.falhas, argumentos.retry_after,
+    )
+    imprimir(resultados, base)
+    if argumentos.saida:
+        with open(argumentos.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultados, arquivo, indent=1)
+    if base:
+        encontradas = regressoes(resultados, base, argumentos.tolerancia)
+        for volume, etapa, antes, depois in encontradas:
+            print(f"REGRESSÃO: {etapa} com {volume} itens passou de {antes:.3f} s para {depois:.3f} s")
+        return 1 if encontradas else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
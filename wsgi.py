@@ -0,0 +1,18 @@
+# Ponto de entrada WSGI para rodar o painel com vários processos atrás de um
+# proxy reverso, por exemplo:
+#
+#   COMPRASGOV_ARGS="--cnpj 00394502000144 --uasg 153978" gunicorn -w 4 -b 0.0.0.0:8050 wsgi:server
+#
+# COMPRASGOV_ARGS aceita as mesmas opções da linha de comando do painel (as
+# desconhecidas são ignoradas com um aviso). Não use
+# --preload: cada worker precisa criar o próprio atualizador depois do fork
+import os
+import shlex
+
+from Dashboard_Dados_Abertos_Comprasgov import cache_para_varios_processos, create_app, interpretar_argumentos
+
+# Sob o gunicorn o normal são vários workers: o cache padrão é o de arquivos e o
+# de memória (de cada processo) é recusado
+argumentos = interpretar_argumentos(shlex.split(os.environ.get("COMPRASGOV_ARGS", "")), tolerante=True)
+app = create_app(cache_para_varios_processos(vars(argumentos)))
+server = app.server